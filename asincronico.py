@@ -0,0 +1,348 @@
+import os
+import time
+import asyncio
+import logging
+import argparse
+from random import Random
+from bonus3 import Cerveza, PackDeCervezas, Deposito, HeladeraBase
+
+# ------------------------------------------------------------------------------------------------ #
+# Misma fiesta que bonus3.py pero con corrutinas de asyncio en lugar de threads: un solo event loop
+# maneja a todos los actores, y en vez de monitor se usan asyncio.Condition y asyncio.Event. Como
+# una tarea ocupa mucho menos que un thread, la cantidad de bebedores queda limitada por la memoria
+# y no por la cantidad de threads del sistema operativo. Las cervezas, el deposito y lo comun de las
+# heladeras se importan de bonus3.py; aca solo estan las condiciones y las tareas de asyncio.
+# ------------------------------------------------------------------------------------------------ #
+
+colors = {
+    'repositor': '',    # se completan con colorama solo al correr desde la terminal
+    'proveedor': '',
+    'bebedor': '',
+    'reset': ''
+}
+cantidad = {
+    'heladeras': 3,
+    'bebedores': 5,
+    'repositores': 1
+}
+frecuencia = {
+    'repositor': 2, # frecuencia de control de heladeras [Segundos]
+    'proveedor': 3, # frecuencia de entrega de paquetes de cerveza [Segundos]
+    'bebedor': 2,   # frecuencia de consumo de cerveza de los clientes [Segundos]
+    'local': 60     # Tiempo que el local esta abierto [Segundos]
+}
+
+# ------------------------------------------------------------------------------------------------ #
+
+class Heladera(HeladeraBase):
+    def __init__(self, capacidadLatas=15, capacidadBotellas=10, id=0):
+        super().__init__(None, capacidadLatas, capacidadBotellas, id)
+        self.reservada = False      # True mientras algun repositor la esta llenando
+        self.vaciaDesde = time.monotonic()  # instante desde el que esta vacia, None si tiene cervezas
+        self.segundosVacia = 0
+        self.lock = asyncio.Lock()
+        self.hayStock = {gusto: asyncio.Condition(self.lock) for gusto in ['lata', 'botella', 'cerveza']}  # una condicion por gusto de bebedor
+
+    async def colocar(self, packDeCervezas):
+        async with self.lock:
+            for tipo in self.capacidad:     # saca del pack todo lo que entra, el resto queda en el pack
+                cervezas = packDeCervezas.removeMany(tipo, self.espaciosPara(tipo))
+                self.cervezas.extend( cervezas )
+                self.avisarStock(tipo, len(cervezas))
+            self.registrarStock()
+
+    def sacar(self, unTipoDeCerveza, cantidad=None):
+        cervezas = super().sacar(unTipoDeCerveza, cantidad)
+        self.registrarStock()
+        return cervezas
+
+    def registrarStock(self):
+        vacia = self.cervezas.size() == 0
+        if vacia and self.vaciaDesde is None:
+            self.vaciaDesde = time.monotonic()
+        elif not vacia and self.vaciaDesde is not None:
+            self.segundosVacia += time.monotonic() - self.vaciaDesde
+            self.vaciaDesde = None
+
+    def tiempoVacia(self):
+        return self.segundosVacia + (time.monotonic() - self.vaciaDesde if self.vaciaDesde is not None else 0)
+
+    def avisarStock(self, unTipoDeCerveza, cantidad):
+        # despierta solo a los bebedores que pueden tomar lo que se acaba de colocar
+        self.hayStock[unTipoDeCerveza].notify(cantidad)
+        self.hayStock['cerveza'].notify(cantidad)
+
+    async def despertarBebedores(self):
+        async with self.lock:
+            for hayStock in self.hayStock.values():
+                hayStock.notify_all()
+
+    def quitarPinchadas(self):
+        sacadas = self.cervezas.removeAll( Cerveza('lata', True) )
+        self.registrarStock()
+        return sacadas
+
+# ------------------------------------------------------------------------------------------------ #
+
+class Proveedor:
+    def __init__(self, simulacion):
+        self.simulacion = simulacion
+        self.nombre = 'Proveedor'
+        self.packDeCervezas = PackDeCervezas()
+        self.entregadas = 0
+
+    async def run(self):
+        while self.simulacion.localAbierto:
+            self.producirCervezas()
+            await self.entregar()
+            await self.simulacion.esperar( self.simulacion.frecuencia['proveedor'] )
+
+    async def entregar(self):
+        entregadas = self.packDeCervezas.size()     # el deposito vacia el pack al guardarlo
+        async with self.simulacion.monitor['repositor']:
+            self.simulacion.deposito.colocar(self.packDeCervezas)
+            self.simulacion.monitor['repositor'].notify_all()
+        self.entregadas += entregadas
+        self.simulacion.log(self, f'{colors["proveedor"]}PROVEEDOR > Entregue un paquete de {entregadas} cervezas{colors["reset"]}')
+        self.packDeCervezas.clear()
+
+    def producirCervezas(self):
+        randint = self.simulacion.random.randint
+        for x in range( randint(1, 30) ):
+            tipo = ('lata' if (randint(0, 10) % 2 == 0) else 'botella')
+            pinchada = (False if ( tipo=='botella' or randint(0, 25) % 5 != 0) else True)
+            self.packDeCervezas.append( Cerveza(tipo, pinchada) )
+
+# ------------------------------------------------------------------------------------------------ #
+
+class Repositor:
+    def __init__(self, simulacion, id=0):
+        self.simulacion = simulacion
+        self.nombre = f'Repositor-{id}'
+        self.id = id
+        self.cervezas = PackDeCervezas()
+        self.pinchadasSacadas = 0
+
+    async def run(self):
+        heladeras = self.simulacion.heladeras
+        for heladera in heladeras:
+            if not heladera.reservada:      # si la esta llenando otro repositor pasamos a la siguiente
+                heladera.enchufada = True
+                await self.llenarReservada(heladera)
+                heladera.enfriadoRapido = True
+                if all(map(lambda unaHeladera: unaHeladera.enfriadoRapido, heladeras)):
+                    self.simulacion.heladerasLlenas.set()
+        await self.controlarHeladeras()
+
+    async def controlarHeladeras(self):
+        while self.simulacion.localAbierto:
+            self.quitarPinchadas()
+            for heladera in self.simulacion.ordenarHeladeras():
+                if not heladera.estaLlena() and not heladera.reservada:
+                    await self.llenarReservada(heladera)
+            await self.simulacion.esperar( self.simulacion.frecuencia['repositor'] )
+
+    async def traerCervezas(self, unTipoDeCerveza, cantidad):
+        deposito = self.simulacion.deposito
+        async with self.simulacion.monitor['repositor']:
+            cervezasDelDeposito, faltantes = deposito.sacar(unTipoDeCerveza, cantidad)
+            self.cervezas.extend(cervezasDelDeposito.get())
+            while faltantes and self.simulacion.localAbierto:
+                self.simulacion.log(self, f'{colors["repositor"]}REPOSITOR[{self.id}] > Sin stock de {unTipoDeCerveza}s para reponer, esperando proveedor...{colors["reset"]}')
+                await self.simulacion.monitor['repositor'].wait()
+                cervezasDelDeposito, faltantes = deposito.sacar(unTipoDeCerveza, faltantes)
+                self.cervezas.extend(cervezasDelDeposito.get())
+
+    async def reponer(self, unTipoDeCerveza, unaHeladera):
+        while unaHeladera.hayEspacioPara(unTipoDeCerveza) and self.simulacion.localAbierto:
+            if not self.cervezas.contains(unTipoDeCerveza):
+                await self.traerCervezas( unTipoDeCerveza, unaHeladera.espaciosPara(unTipoDeCerveza) )
+            await unaHeladera.colocar( self.cervezas )
+
+    async def llenar(self, heladera):
+        await self.reponer('botella', heladera)
+        await self.reponer('lata', heladera)
+        self.simulacion.log(self, f'{colors["repositor"]}REPOSITOR[{self.id}] > Heladera[{heladera.id}] llena{colors["reset"]}')
+
+    async def llenarReservada(self, heladera):
+        heladera.reservada = True
+        await self.llenar(heladera)
+        heladera.reservada = False
+
+    def quitarPinchadas(self):
+        for heladera in self.simulacion.heladeras:
+            sacadas = heladera.quitarPinchadas()
+            self.pinchadasSacadas += sacadas
+            if sacadas != 0:
+                self.simulacion.log(self, f'{colors["repositor"]}REPOSITOR[{self.id}] > {sacadas} latas pinchadas sacadas de Heladera[{heladera.id}]{colors["reset"]}')
+
+# ------------------------------------------------------------------------------------------------ #
+
+class Bebedor:
+    def __init__(self, simulacion, cervezasQueToma='cerveza', limite=0, id=0):
+        self.simulacion = simulacion
+        self.nombre = f'Bebedor-{id}'
+        self.id = id
+        self.limite = limite
+        self.cervezasTomadas = 0
+        self.cervezasQueToma = cervezasQueToma
+        self.espera = 0             # segundos esperando que el repositor llene la heladera
+
+    async def run(self):
+        await self.simulacion.heladerasLlenas.wait()
+        self.presentarse()
+        while self.cervezasTomadas < self.limite and self.simulacion.localAbierto:
+            await self.tomarCerveza( self.elegirHeladera( self.simulacion.heladeras ) )
+            if self.cervezasTomadas == self.limite:
+                self.simulacion.log(self, f'{colors["bebedor"]}BEBEDOR[{self.id}] > No puedo tomar más, me voy a dormir...{colors["reset"]}')
+            await self.simulacion.esperar( self.simulacion.frecuencia['bebedor'] )
+
+    async def tomarCerveza(self, heladera):
+        hayStock = heladera.hayStock[self.cervezasQueToma]
+        inicio = time.monotonic()
+        async with hayStock:
+            cerveza = self.elegirCerveza(heladera)
+            while not(cerveza) and self.simulacion.localAbierto:
+                self.simulacion.log(self, f'{colors["bebedor"]}BEBEDOR[{self.id}] > No hay {self.cervezasQueToma}s en la heladera[{heladera.id}], esperando repositor...{colors["reset"]}')
+                await hayStock.wait()
+                cerveza = self.elegirCerveza(heladera)
+        self.espera += time.monotonic() - inicio
+        if not(cerveza):
+            return
+        if cerveza.pinchada:
+            self.simulacion.log(self, f'{colors["bebedor"]}BEBEDOR[{self.id}] > Saque una lata pinchada de la heladera[{heladera.id}], Voy a sacar otra...{colors["reset"]}')
+            await self.tomarCerveza(heladera)
+        else:
+            self.cervezasTomadas += 1
+            self.simulacion.log(self, f'{colors["bebedor"]}BEBEDOR[{self.id}] > Me tome una {self.cervezasQueToma}, llevo tomadas {self.cervezasTomadas} cervezas y puedo tomar hasta {self.limite}...{colors["reset"]}')
+
+    def elegirCerveza(self, heladera):
+        if self.cervezasQueToma == 'cerveza':
+            tipo = 'lata' if (self.simulacion.random.randint(0, 10) % 2 == 0) else 'botella'
+            return heladera.sacar(tipo) or heladera.sacar('botella' if tipo == 'lata' else 'lata')
+        else:
+            return heladera.sacar(self.cervezasQueToma)
+
+    def elegirHeladera(self, listaDeHeladeras):
+        return listaDeHeladeras[ self.simulacion.random.randint(0, len(listaDeHeladeras)-1) ]
+
+    def presentarse(self):
+        self.simulacion.log(self, f'{colors["bebedor"]}BEBEDOR[{self.id}] > Hola vengo a tomar {self.cervezasQueToma}s!{colors["reset"]}')
+
+# ------------------------------------------------------------------------------------------------ #
+
+class SimulacionAsincronica:
+    def __init__(self, cantidad=cantidad, frecuencia=frecuencia, semilla=None):
+        self.cantidad = dict(cantidad)
+        self.frecuencia = dict(frecuencia)
+        self.random = Random(semilla)
+        self.localAbierto = False
+        self.monitor = {
+            'repositor': asyncio.Condition()
+        }
+        self.heladerasLlenas = asyncio.Event()      # los bebedores esperan a que se llenen las heladeras por primera vez
+        self.cerrado = asyncio.Event()              # se activa al cerrar el local y corta las esperas entre vueltas de los actores
+        self.deposito = Deposito()
+        self.heladeras = self.crearHeladeras()
+        self.proveedor = Proveedor(self)
+        self.repositores = self.crearRepositores()
+        self.bebedores = self.crearBebedores()
+
+    def crearHeladeras(self):
+        heladeras = []
+        for i in range(self.cantidad['heladeras']):
+            heladeras.append(Heladera(id=i))
+        return heladeras
+
+    def ordenarHeladeras(self):
+        # mismo orden que ColaDeHeladeras en bonus3.py: primero las que tienen menos cervezas
+        return sorted(self.heladeras, key=lambda heladera: (heladera.cervezas.size(), heladera.id))
+
+    def crearBebedores(self):
+        bebedores = []
+        for i in range(self.cantidad['bebedores']):
+            limite = self.random.randint(1, 10)
+            x = self.random.randint(1, 30) % 3
+            cervezasQueToma = 'botella' if x==0 else ( 'lata' if x==1 else 'cerveza')
+            bebedores.append( Bebedor(self, cervezasQueToma, limite, i))
+        return bebedores
+
+    def crearRepositores(self):
+        repositores = []
+        for i in range(self.cantidad['repositores']):
+            repositores.append( Repositor(self, i))
+        return repositores
+
+    def log(self, actor, mensaje):
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            logging.info(f'[{actor.nombre if actor else "MainThread"}] - {mensaje}')
+
+    async def esperar(self, segundos):
+        # como asyncio.sleep pero vuelve apenas cierra el local, asi gather no espera una vuelta entera
+        try:
+            await asyncio.wait_for(self.cerrado.wait(), segundos)
+        except asyncio.TimeoutError:
+            pass
+
+    async def correr(self):
+        self.localAbierto = True
+        self.log(None, f'LOCAL ABIERTO !')
+
+        tareas = [asyncio.create_task(self.proveedor.run())]
+        for repositor in self.repositores:
+            tareas.append( asyncio.create_task(repositor.run()) )
+        for bebedor in self.bebedores:
+            tareas.append( asyncio.create_task(bebedor.run()) )
+        await asyncio.sleep( self.frecuencia['local'] )
+
+        self.localAbierto = False
+        self.log(None, f'LOCAL CERRADO !')
+
+        self.cerrado.set()
+        self.heladerasLlenas.set()
+        for key in self.monitor.keys():
+            async with self.monitor[key]:
+                self.monitor[key].notify_all()
+        for heladera in self.heladeras:
+            await heladera.despertarBebedores()
+        await asyncio.gather(*tareas)
+        return self
+
+    def resultado(self):
+        tomadas = sum(map(lambda bebedor: bebedor.cervezasTomadas, self.bebedores))
+        espera = sum(map(lambda bebedor: bebedor.espera, self.bebedores))
+        return {
+            'entregadas': self.proveedor.entregadas,
+            'tomadas': tomadas,
+            'espera': espera,                                       # segundos esperando, sumando todos los bebedores
+            'esperaPorCerveza': espera / tomadas if tomadas else 0,
+            'heladeraVacia': sum(map(lambda heladera: heladera.tiempoVacia(), self.heladeras)),
+            'pinchadas': sum(map(lambda repositor: repositor.pinchadasSacadas, self.repositores))
+        }
+
+# ------------------------------------------------------------------------------------------------ #
+
+if __name__ == '__main__':
+    from colorama import init, Fore
+
+    parser = argparse.ArgumentParser(description='Corre la fiesta de bonus3.py con asyncio')
+    parser.add_argument('--heladeras', type=int, default=cantidad['heladeras'])
+    parser.add_argument('--bebedores', type=int, default=cantidad['bebedores'])
+    parser.add_argument('--repositores', type=int, default=cantidad['repositores'])
+    parser.add_argument('--local', type=float, default=frecuencia['local'], help='segundos que el local esta abierto')
+    parser.add_argument('--semilla', type=int)
+    args = parser.parse_args()
+
+    init(convert=os.name == 'nt')
+    logging.basicConfig(format='%(asctime)s.%(msecs)03d %(message)s', datefmt='%H:%M:%S', level=logging.INFO)
+    colors.update({
+        'repositor': Fore.GREEN,    # color de Repositor
+        'proveedor': Fore.YELLOW,   # color de Provedor
+        'bebedor': Fore.MAGENTA,    # color de Bebedores
+        'reset': Fore.WHITE         # vuelve a poner el color en blanco
+    })
+    cantidad.update(heladeras=args.heladeras, bebedores=args.bebedores, repositores=args.repositores)
+    frecuencia.update(local=args.local)
+
+    simulacion = asyncio.run( SimulacionAsincronica(cantidad, frecuencia, args.semilla).correr() )
+    logging.info(simulacion.resultado())
@@ -0,0 +1,81 @@
+import os
+import csv
+import sys
+import argparse
+import itertools
+from random import Random
+from concurrent.futures import ProcessPoolExecutor
+
+import discreto
+
+# ------------------------------------------------------------------------------------------------ #
+# Barrido de parametros: corre muchas noches de discreto.py con distintas combinaciones de cantidad y
+# frecuencia, repartidas en todos los nucleos, y junta las metricas de cada noche en una sola tabla.
+# Cada corrida arma su propia SimulacionDiscreta, asi que no comparten nada entre si.
+# ------------------------------------------------------------------------------------------------ #
+
+grilla = {
+    'cantidad': {
+        'heladeras': [3, 10],
+        'bebedores': [5, 50],
+        'repositores': [1, 2]
+    },
+    'frecuencia': {
+        'repositor': [1, 2],
+        'proveedor': [1, 3],
+        'bebedor': [2],
+        'local': [60]
+    }
+}
+columnas = ['semilla'] + list(grilla['cantidad']) + list(grilla['frecuencia']) + \
+    ['entregadas', 'tomadas', 'espera', 'esperaPorCerveza', 'heladeraVacia', 'pinchadas']
+
+# ------------------------------------------------------------------------------------------------ #
+
+def combinaciones(grilla):
+    claves = [(seccion, clave) for seccion in grilla for clave in grilla[seccion]]
+    for valores in itertools.product(*[grilla[seccion][clave] for seccion, clave in claves]):
+        configuracion = {seccion: {} for seccion in grilla}
+        for (seccion, clave), valor in zip(claves, valores):
+            configuracion[seccion][clave] = valor
+        yield configuracion
+
+def muestrear(grilla, muestras, random):
+    for x in range(muestras):
+        yield {seccion: {clave: random.choice(valores) for clave, valores in grilla[seccion].items()} for seccion in grilla}
+
+def configuraciones(grilla, muestras=0, repeticiones=1, semilla=0):
+    random = Random(semilla)
+    elegidas = muestrear(grilla, muestras, random) if muestras else combinaciones(grilla)
+    for configuracion in elegidas:
+        for x in range(repeticiones):
+            yield dict(configuracion, semilla=random.randrange(2**32))
+
+def correrSimulacion(configuracion):
+    cantidad = dict(discreto.cantidad, **configuracion['cantidad'])
+    frecuencia = dict(discreto.frecuencia, **configuracion['frecuencia'])
+    simulacion = discreto.SimulacionDiscreta(cantidad, frecuencia, configuracion['semilla']).correr()
+    return dict(semilla=configuracion['semilla'], **configuracion['cantidad'], **configuracion['frecuencia'], **simulacion.resultado())
+
+def barrer(grilla, muestras=0, repeticiones=1, semilla=0, procesos=None):
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        return list(pool.map(correrSimulacion, configuraciones(grilla, muestras, repeticiones, semilla), chunksize=4))
+
+# ------------------------------------------------------------------------------------------------ #
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Corre un barrido de parametros sobre discreto.py')
+    parser.add_argument('--muestras', type=int, default=0, help='cantidad de combinaciones al azar (0 = toda la grilla)')
+    parser.add_argument('--repeticiones', type=int, default=1, help='noches por combinacion, cada una con otra semilla')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--procesos', type=int, default=os.cpu_count())
+    parser.add_argument('--csv', help='archivo donde guardar la tabla (por defecto la salida estandar)')
+    args = parser.parse_args()
+
+    filas = barrer(grilla, args.muestras, args.repeticiones, args.semilla, args.procesos)
+    salida = open(args.csv, 'w', newline='') if args.csv else sys.stdout
+    writer = csv.DictWriter(salida, fieldnames=columnas)
+    writer.writeheader()
+    writer.writerows(filas)
+    if args.csv:
+        salida.close()
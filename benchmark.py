@@ -0,0 +1,237 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import inspect
+import platform
+import subprocess
+import importlib.util
+from datetime import datetime
+
+# ------------------------------------------------------------------------------------------------ #
+# Benchmarks de la fiesta, para saber si un cambio en PackDeCervezas, Heladera o los locks mejora algo.
+#   - micro: count, contains, remove, colocar, sacar y quitarPinchadas de las clases de bonus3.py
+#     con heladeras cada vez mas grandes
+#   - macro: corre script.py, bonus-1y2.py y bonus3.py enteros con mas heladeras y bebedores y
+#     saca de los logs las cervezas movidas por segundo y la espera de los bebedores
+# Los resultados se guardan en JSON y se pueden comparar con los de una corrida anterior.
+# ------------------------------------------------------------------------------------------------ #
+
+stocks = [10, 100, 1000, 10000]    # cervezas de cada tipo en la heladera de los micro benchmarks
+escalas = [
+    {'heladeras': 3, 'bebedores': 5},
+    {'heladeras': 6, 'bebedores': 50},
+    {'heladeras': 12, 'bebedores': 200}
+]
+frecuencia = {
+    'repositor': 0.2,
+    'proveedor': 0.3,
+    'bebedor': 0.1,
+    'local': 10     # alcanza para que el primer llenado de la escala mas grande termine y los bebedores tomen
+}
+scripts = ['script.py', 'bonus-1y2.py', 'bonus3.py']
+
+# ------------------------------------------------------------------------------------------------ #
+
+def cargarModulo(archivo):
+    # los scripts no hacen nada al importarlos, asi que se cargan por ruta (bonus-1y2.py no es un
+    # nombre de modulo valido) y el bar se arma con su Simulacion
+    nombre = os.path.splitext(os.path.basename(archivo))[0].replace('-', '_')
+    especificacion = importlib.util.spec_from_file_location(nombre, archivo)
+    modulo = importlib.util.module_from_spec(especificacion)
+    especificacion.loader.exec_module(modulo)
+    return modulo
+
+formatoDeLog = '%(asctime)s.%(msecs)03d [%(threadName)s] - %(message)s'     # el de los scripts, lo lee analizarLog
+carpeta = os.path.dirname(os.path.abspath(__file__))     # la de benchmark.py y los scripts, para correr desde cualquier lado
+noche = '''
+import sys
+import logging
+sys.path.insert(0, {carpeta!r})
+from benchmark import cargarModulo
+logging.basicConfig(format={formato!r}, datefmt='%H:%M:%S', level=logging.INFO)
+bar = cargarModulo({archivo!r})
+bar.Simulacion(dict(bar.cantidad, **{escala!r}), dict(bar.frecuencia, **{frecuencia!r})).correr()
+'''
+
+def percentil(valores, p):
+    if not valores:
+        return 0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))]
+
+# ------------------------------------------------------------------------------------------------ #
+
+def medir(funcion, preparar, repeticiones):
+    # mejor de varias tandas, cada una sobre una heladera recien armada
+    tiempos = []
+    for x in range(repeticiones):
+        argumentos = preparar()
+        inicio = time.perf_counter()
+        operaciones = funcion(*argumentos)
+        tiempos.append(time.perf_counter() - inicio)
+    segundos = min(tiempos)
+    return {'segundos': segundos, 'operaciones': operaciones, 'porSegundo': operaciones / segundos if segundos else 0}
+
+def microBenchmarks(archivo, stocks, repeticiones):
+    modulo = cargarModulo(archivo if os.path.exists(archivo) else os.path.join(carpeta, archivo))
+    Cerveza, PackDeCervezas = modulo.Cerveza, modulo.PackDeCervezas
+    conSimulacion = 'simulacion' in inspect.signature(modulo.Heladera).parameters
+    simulacion = modulo.Simulacion() if conSimulacion else None     # en bonus3.py cada heladera es de una Simulacion
+
+    def Heladera(**capacidades):
+        return modulo.Heladera(simulacion, **capacidades) if simulacion else modulo.Heladera(**capacidades)
+
+    def pack(stock):
+        cervezas = PackDeCervezas()
+        for x in range(stock):
+            cervezas.append( Cerveza('botella') )
+            cervezas.append( Cerveza('lata', x % 5 == 0) )
+        return cervezas
+
+    def heladera(stock):
+        unaHeladera = Heladera(capacidadLatas=stock, capacidadBotellas=stock)
+        unaHeladera.colocar( pack(stock) )
+        return unaHeladera
+
+    def contar(cervezas, veces):
+        for x in range(veces):
+            cervezas.count('lata')
+        return veces
+
+    def contiene(cervezas, veces):
+        for x in range(veces):
+            cervezas.contains('botella')
+        return veces
+
+    def sacarDelPack(cervezas, stock):
+        for x in range(stock):
+            cervezas.remove('lata')
+        return stock
+
+    def colocar(unaHeladera, cervezas):
+        unaHeladera.colocar(cervezas)
+        return unaHeladera.cervezas.size()
+
+    def sacar(unaHeladera, stock):
+        for x in range(stock):
+            unaHeladera.sacar('botella')
+        return stock
+
+    def quitarPinchadas(unaHeladera):
+        return unaHeladera.quitarPinchadas()       # una sola llamada, se cuentan las latas que saco
+
+    resultados = []
+    for stock in stocks:
+        casos = {       # operacion -> funcion, preparacion y que cuenta la funcion
+            'count': (contar, lambda: (pack(stock), 1000), 'llamadas'),
+            'contains': (contiene, lambda: (pack(stock), 1000), 'llamadas'),
+            'remove': (sacarDelPack, lambda: (pack(stock), stock), 'cervezas'),
+            'colocar': (colocar, lambda: (Heladera(capacidadLatas=stock, capacidadBotellas=stock), pack(stock)), 'cervezas'),
+            'sacar': (sacar, lambda: (heladera(stock), stock), 'cervezas'),
+            'quitarPinchadas': (quitarPinchadas, lambda: (heladera(stock),), 'pinchadas')
+        }
+        for operacion, (funcion, preparar, unidad) in casos.items():
+            resultados.append(dict(operacion=operacion, stock=stock, unidad=unidad, **medir(funcion, preparar, repeticiones)))
+            print(f'{operacion:>16} {stock:>6}: {resultados[-1]["porSegundo"]:>14,.0f} {unidad}/s', file=sys.stderr)
+    return resultados
+
+# ------------------------------------------------------------------------------------------------ #
+
+lineaDeLog = re.compile(r'^(\d\d):(\d\d):(\d\d)\.(\d{3}) \[(.+?)\] - (.*)$')
+
+def analizarLog(lineas):
+    entregadas, tomadas, esperas = 0, 0, []
+    esperando = {}      # thread del bebedor -> momento en que empezo a esperar
+    for linea in lineas:
+        encontrada = lineaDeLog.match(linea)
+        if not encontrada:
+            continue
+        horas, minutos, segundos, milisegundos, thread, mensaje = encontrada.groups()
+        ahora = int(horas) * 3600 + int(minutos) * 60 + int(segundos) + int(milisegundos) / 1000
+        if 'Entregue un paquete de' in mensaje:
+            entregadas += int(re.search(r'paquete de (\d+)', mensaje).group(1))
+        elif 'esperando repositor' in mensaje:
+            esperando.setdefault(thread, ahora)
+        elif 'Me tome una' in mensaje:
+            tomadas += 1
+            if thread in esperando:
+                esperas.append(ahora - esperando.pop(thread))
+    return entregadas, tomadas, esperas
+
+def macroBenchmark(archivo, escala, frecuencia):
+    fuente = noche.format(carpeta=carpeta, formato=formatoDeLog, archivo=os.path.join(carpeta, archivo), escala=dict(escala), frecuencia=dict(frecuencia))
+    inicio = time.perf_counter()
+    proceso = subprocess.run([sys.executable, '-c', fuente], capture_output=True, text=True, timeout=frecuencia['local'] + 60)
+    segundos = time.perf_counter() - inicio
+    entregadas, tomadas, esperas = analizarLog(proceso.stderr.splitlines())
+    return {
+        'script': archivo,
+        **escala,
+        'segundos': segundos,
+        'entregadas': entregadas,
+        'tomadas': tomadas,
+        'cervezasPorSegundo': (entregadas + tomadas) / frecuencia['local'],
+        'esperas': len(esperas),
+        'espera': {f'p{p}': percentil(esperas, p) for p in (50, 90, 99)},
+        'ok': proceso.returncode == 0
+    }
+
+def macroBenchmarks(scripts, escalas, frecuencia):
+    resultados = []
+    for archivo in scripts:
+        for escala in escalas:
+            resultados.append(macroBenchmark(archivo, escala, frecuencia))
+            resultado = resultados[-1]
+            print(f'{archivo:>14} {escala["heladeras"]:>4} heladeras {escala["bebedores"]:>5} bebedores: {resultado["cervezasPorSegundo"]:>9,.1f} cervezas/s, espera p50 {resultado["espera"]["p50"]:.3f}s p99 {resultado["espera"]["p99"]:.3f}s', file=sys.stderr)
+    return resultados
+
+# ------------------------------------------------------------------------------------------------ #
+
+def comparar(anterior, actual):
+    # cociente actual / anterior para cada medicion que este en las dos corridas
+    previos = {(resultado['operacion'], resultado['stock']): resultado for resultado in anterior.get('micro', [])}
+    for resultado in actual.get('micro', []):
+        previo = previos.get((resultado['operacion'], resultado['stock']))
+        if previo and previo['porSegundo']:
+            print(f'{resultado["operacion"]:>16} {resultado["stock"]:>6}: x{resultado["porSegundo"] / previo["porSegundo"]:.2f}')
+    previos = {(resultado['script'], resultado['heladeras'], resultado['bebedores']): resultado for resultado in anterior.get('macro', [])}
+    for resultado in actual.get('macro', []):
+        previo = previos.get((resultado['script'], resultado['heladeras'], resultado['bebedores']))
+        if previo and previo['cervezasPorSegundo']:
+            print(f'{resultado["script"]:>14} {resultado["heladeras"]:>4} {resultado["bebedores"]:>5}: x{resultado["cervezasPorSegundo"] / previo["cervezasPorSegundo"]:.2f} cervezas/s, espera p99 {previo["espera"]["p99"]:.3f}s -> {resultado["espera"]["p99"]:.3f}s')
+
+# ------------------------------------------------------------------------------------------------ #
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks de las estructuras y de los scripts de la fiesta')
+    parser.add_argument('--solo', choices=['micro', 'macro'], help='correr solo una de las dos partes')
+    parser.add_argument('--clases', default='bonus3.py', help='script del que se toman las clases para los micro benchmarks (bonus-1y2.py o bonus3.py)')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--local', type=float, default=frecuencia['local'], help='segundos que se corre cada script')
+    parser.add_argument('--salida', help='archivo JSON donde guardar los resultados (por defecto la salida estandar)')
+    parser.add_argument('--comparar', help='JSON de una corrida anterior contra el que comparar')
+    args = parser.parse_args()
+
+    frecuencia.update(local=args.local)
+    resultados = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'frecuencia': frecuencia
+    }
+    if args.solo != 'macro':
+        resultados['micro'] = microBenchmarks(args.clases, stocks, args.repeticiones)
+    if args.solo != 'micro':
+        resultados['macro'] = macroBenchmarks(scripts, escalas, frecuencia)
+
+    if args.salida:
+        with open(args.salida, 'w') as salida:
+            json.dump(resultados, salida, indent=4)
+    else:
+        json.dump(resultados, sys.stdout, indent=4)
+        print()
+    if args.comparar:
+        with open(args.comparar) as anterior:
+            comparar(json.load(anterior), resultados)
@@ -3,18 +3,15 @@ import time
 import logging
 import threading
 from random import randint
-from colorama import init , Fore
+from bonus3 import Cerveza, PackDeCervezas, Deposito, HeladeraBase
 
 # ------------------------------------------------------------------------------------------------ #
 
-init(convert=os.name == 'nt')
-logging.basicConfig(format='%(asctime)s.%(msecs)03d [%(threadName)s] - %(message)s', datefmt='%H:%M:%S', level=logging.INFO)
-
 colors = {
-    'repositor': Fore.GREEN,    # color de Repositor
-    'proveedor': Fore.YELLOW,   # color de Provedor
-    'bebedor': Fore.MAGENTA,    # color de Bebedores
-    'reset': Fore.WHITE         # vuelve a poner el color en blanco
+    'repositor': '',    # se completan con colorama solo al correr desde la terminal
+    'proveedor': '',
+    'bebedor': '',
+    'reset': ''
 }
 cantidad = {
     'heladeras': 3,
@@ -24,110 +21,66 @@ frecuencia = {
     'repositor': 2, # frecuencia de entrega de paquetes de cerveza [Segundos]
     'proveedor': 3, # frecuencia de control de heladeras [Segundos]
     'bebedor': 2,   # frecuencia de consumo de cerveza de los clientes [Segundos]
+    'cierre': 1,    # plazo para que terminen los threads despues de cerrar el local [Segundos]
     'local': 60     # Tiempo que el local esta abierto [Segundos], Si es muy corto los threads no terminan de cumplir sus tareas
 }
-monitor = {
-    'repositor': threading.Condition(),
-    'bebedores': threading.Condition()
-}
-
-# ------------------------------------------------------------------------------------------------ #
-
-class Cerveza:
-    def __init__(self, tipo='cerveza', pinchada=False):
-        self.tipo = tipo
-        self.pinchada = pinchada
-
-class PackDeCervezas:
-    def __init__(self):
-        self.cervezas= []
-
-    def set(self, listaDeCervezas):
-        self.cervezas = listaDeCervezas
-
-    def get(self):
-        return self.cervezas
-    
-    def getTipos(self):
-        return list(map(lambda cerveza: cerveza.tipo ,self.cervezas))
-
-    def append(self, unaCerveza):
-        self.cervezas.append(unaCerveza)
-    
-    def clear(self):
-        self.cervezas.clear()
-
-    def remove(self, unTipoDeCerveza):
-        return self.cervezas.pop( self.getTipos().index(unTipoDeCerveza))
-
-    def pop(self, index = 0):
-        return self.cervezas.pop( index )
-
-    def size(self):
-        return len(self.cervezas)
-
-    def contains(self, unTipoDeCerveza):
-        return unTipoDeCerveza in self.getTipos()
-    
-    def count(self, unTipoDeCerveza):
-        return self.getTipos().count(unTipoDeCerveza)
 
 # ------------------------------------------------------------------------------------------------ #
 
-class Deposito:
-    def __init__(self):
-        self.cervezas = PackDeCervezas()
-
-    def colocar(self, packDeCervezas):
-        for cerveza in packDeCervezas.cervezas:
-            self.cervezas.append( cerveza )
-
-    def sacar(self, unTipoDeCerveza):
-        return self.cervezas.remove( unTipoDeCerveza ) if (self.cervezas.contains(unTipoDeCerveza)) else False
-
-# ------------------------------------------------------------------------------------------------ #
-
-class Heladera(Deposito):
+class Heladera(HeladeraBase):
     def __init__(self, capacidadLatas=15, capacidadBotellas=10, id=0):
-        super().__init__()
-        self.id = id
-        self.capacidad = {'lata': capacidadLatas,'botella': capacidadBotellas}
-        self.enchufada = False
-        self.enfriadoRapido = False
+        super().__init__(None, capacidadLatas, capacidadBotellas, id)
+        self.lock = threading.RLock()
+        self.hayStock = {gusto: threading.Condition(self.lock) for gusto in ['lata', 'botella', 'cerveza']}  # un monitor por gusto de bebedor
     
-    def colocar(self, unaCerveza):
-        if( self.hayEspacioPara(unaCerveza.tipo) ):
-            self.cervezas.append( unaCerveza )
-
-    def hayEspacioPara(self, unTipoDeCerveza):
-        return self.cervezas.count(unTipoDeCerveza) < self.capacidad[unTipoDeCerveza]
-
-    def espaciosPara(self, unTipoDeCerveza):
-        return self.capacidad[unTipoDeCerveza] - self.cervezas.count(unTipoDeCerveza)
-    
-    def estaLlena(self):
-        return self.cervezas.size() == (self.capacidad['lata'] + self.capacidad['botella'])
+    def colocar(self, packDeCervezas):
+        with self.lock:
+            for tipo in self.capacidad:     # saca del pack todo lo que entra, el resto queda en el pack
+                cervezas = packDeCervezas.removeMany(tipo, self.espaciosPara(tipo))
+                self.cervezas.extend( cervezas )
+                self.avisarStock(tipo, len(cervezas))
+
+    def sacar(self, unTipoDeCerveza, cantidad=None):
+        with self.lock:
+            return super().sacar(unTipoDeCerveza, cantidad)
+
+    def avisarStock(self, unTipoDeCerveza, cantidad):
+        # despierta solo a los bebedores que pueden tomar lo que se acaba de colocar
+        self.hayStock[unTipoDeCerveza].notify(cantidad)
+        self.hayStock['cerveza'].notify(cantidad)
+
+    def despertarBebedores(self):
+        with self.lock:
+            for hayStock in self.hayStock.values():
+                hayStock.notify_all()
+
+    def quitarPinchadas(self):
+        with self.lock:
+            return self.cervezas.removeAll( Cerveza('lata', True) )
 
 # ------------------------------------------------------------------------------------------------ #
 
 class Proveedor(threading.Thread):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, simulacion):
+        super().__init__(daemon=True)     # si no termina antes del plazo de cierre no traba la salida
+        self.simulacion = simulacion
         self.packDeCervezas = PackDeCervezas()
+        self.entregadas = 0
 
     def run(self):
-        global localAbierto, frecuencia
-        while localAbierto:
+        while self.simulacion.localAbierto:
             self.producirCervezas()
             self.entregar()
-            time.sleep( frecuencia['proveedor'] )
+            self.simulacion.cerrado.wait( self.simulacion.frecuencia['proveedor'] )
 
     def entregar(self):
-        global monitor, deposito
+        entregadas = self.packDeCervezas.size()     # el deposito vacia el pack al guardarlo
+        monitor = self.simulacion.monitor
         with monitor['repositor']:
-            deposito.colocar(self.packDeCervezas)
+            self.simulacion.deposito.colocar(self.packDeCervezas)
             monitor['repositor'].notify()
-        logging.info(f'{colors["proveedor"]}PROVEEDOR > Entregue un paquete de {self.packDeCervezas.size()} cervezas{colors["reset"]}')
+        self.entregadas += entregadas
+        logging.info(f'{colors["proveedor"]}PROVEEDOR > Entregue un paquete de {entregadas} cervezas{colors["reset"]}')
         self.packDeCervezas.clear()
 
     def producirCervezas(self):
@@ -139,46 +92,44 @@ class Proveedor(threading.Thread):
 # ------------------------------------------------------------------------------------------------ #
 
 class Repositor(threading.Thread):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, simulacion):
+        super().__init__(daemon=True)
+        self.simulacion = simulacion
         self.cervezas = PackDeCervezas()
+        self.pinchadasSacadas = 0
 
     def run(self):
-        global heladeras
-        for heladera in heladeras:
+        for heladera in self.simulacion.heladeras:
             heladera.enchufada = True
             self.llenar(heladera)
             heladera.enfriadoRapido = True
+        self.simulacion.heladerasLlenas.set()
         self.controlarHeladeras()
 
     def controlarHeladeras(self):
-        global localAbierto, heladeras
-        while localAbierto:
-            with monitor['bebedores']:
-                monitor['bebedores'].notify()
-            for heladera in heladeras:
+        while self.simulacion.localAbierto:
+            for heladera in self.simulacion.heladeras:
                 self.quitarPinchadas(heladera)
                 if not heladera.estaLlena():
                     self.llenar(heladera)
-            time.sleep(frecuencia['repositor'])
+            self.simulacion.cerrado.wait( self.simulacion.frecuencia['repositor'] )
 
     def traerCervezas(self, unTipoDeCerveza, cantidad):
-        global monitor, deposito
-        for x in range(cantidad):
-            cervezaDelDeposito = deposito.sacar(unTipoDeCerveza)
-            with monitor['repositor']:
-                while not(cervezaDelDeposito) and localAbierto:
-                    logging.info(f'{colors["repositor"]}REPOSITOR > Sin stock de {unTipoDeCerveza}s para reponer, esperando proveedor...{colors["reset"]}')
-                    monitor['repositor'].wait()
-                    cervezaDelDeposito = deposito.sacar(unTipoDeCerveza)
-                self.cervezas.append(cervezaDelDeposito)
+        monitor, deposito = self.simulacion.monitor, self.simulacion.deposito
+        with monitor['repositor']:
+            cervezasDelDeposito, faltantes = deposito.sacar(unTipoDeCerveza, cantidad)
+            self.cervezas.extend(cervezasDelDeposito.get())
+            while faltantes and self.simulacion.localAbierto:
+                logging.info(f'{colors["repositor"]}REPOSITOR > Sin stock de {unTipoDeCerveza}s para reponer, esperando proveedor...{colors["reset"]}')
+                monitor['repositor'].wait()
+                cervezasDelDeposito, faltantes = deposito.sacar(unTipoDeCerveza, faltantes)
+                self.cervezas.extend(cervezasDelDeposito.get())
 
     def reponer(self, unTipoDeCerveza, unaHeladera):
-        while unaHeladera.hayEspacioPara(unTipoDeCerveza):
-            if self.cervezas.contains(unTipoDeCerveza):
-                unaHeladera.colocar( self.cervezas.remove(unTipoDeCerveza) )
-            else:
+        while unaHeladera.hayEspacioPara(unTipoDeCerveza) and self.simulacion.localAbierto:
+            if not self.cervezas.contains(unTipoDeCerveza):
                 self.traerCervezas( unTipoDeCerveza, unaHeladera.espaciosPara(unTipoDeCerveza) )
+            unaHeladera.colocar( self.cervezas )
     
     def llenar(self, heladera):
         self.reponer('botella', heladera)
@@ -186,39 +137,41 @@ class Repositor(threading.Thread):
         logging.info(f'{colors["repositor"]}REPOSITOR > Heladera[{heladera.id}] llena{colors["reset"]}')
     
     def quitarPinchadas(self, heladera):
-        heladera.cervezas.set(list(filter(lambda cerveza: not(cerveza.pinchada), heladera.cervezas.get())))
-        if heladera.espaciosPara('lata') != 0:
-            logging.info(f'{colors["repositor"]}REPOSITOR > {heladera.espaciosPara("lata")} latas pinchadas sacadas de Heladera[{heladera.id}]{colors["reset"]}')
+        sacadas = heladera.quitarPinchadas()
+        self.pinchadasSacadas += sacadas
+        if sacadas != 0:
+            logging.info(f'{colors["repositor"]}REPOSITOR > {sacadas} latas pinchadas sacadas de Heladera[{heladera.id}]{colors["reset"]}')
 
 # ------------------------------------------------------------------------------------------------ #
 
 class Bebedor(threading.Thread):
-    def __init__(self, cervezasQueToma='cerveza', limite=0, id=0):
-        super().__init__()
+    def __init__(self, simulacion, cervezasQueToma='cerveza', limite=0, id=0):
+        super().__init__(daemon=True)
+        self.simulacion = simulacion
         self.id = id
         self.limite = limite
         self.cervezasTomadas = 0
         self.cervezasQueToma = cervezasQueToma
 
     def run(self):
-        global frecuencia, heladeras,monitor
-        with monitor['bebedores']:
-            monitor['bebedores'].wait()     # Esopera que el repositor llene las heladeras 
+        self.simulacion.heladerasLlenas.wait()
         self.presentarse()
-        while self.cervezasTomadas < self.limite and localAbierto:
-            self.tomarCerveza( self.elegirHeladera( heladeras ) )
+        while self.cervezasTomadas < self.limite and self.simulacion.localAbierto:
+            self.tomarCerveza( self.elegirHeladera( self.simulacion.heladeras ) )
             if self.cervezasTomadas == self.limite:
                 logging.info(f'{colors["bebedor"]}BEBEDOR[{self.id}] > No puedo tomar más, me voy a dormir...{colors["reset"]}')
-            time.sleep(frecuencia['bebedor'])
+            self.simulacion.cerrado.wait( self.simulacion.frecuencia['bebedor'] )
     
     def tomarCerveza(self, heladera):
-        global monitor
-        cerveza = self.elegirCerveza(heladera)
-        with monitor['bebedores']:
-            while not(cerveza) and localAbierto:
+        hayStock = heladera.hayStock[self.cervezasQueToma]
+        with hayStock:
+            cerveza = self.elegirCerveza(heladera)
+            while not(cerveza) and self.simulacion.localAbierto:
                 logging.info(f'{colors["bebedor"]}BEBEDOR[{self.id}] > No hay {self.cervezasQueToma}s en la heladera[{heladera.id}], esperando repositor...{colors["reset"]}')
-                monitor['bebedores'].wait()
+                hayStock.wait()
                 cerveza = self.elegirCerveza(heladera)
+        if not(cerveza):
+            return
         if cerveza.pinchada:
             logging.info(f'{colors["bebedor"]}BEBEDOR[{self.id}] > Saque una lata pinchada de la heladera[{heladera.id}], Voy a sacar otra...{colors["reset"]}')
             self.tomarCerveza(heladera)
@@ -228,7 +181,8 @@ class Bebedor(threading.Thread):
     
     def elegirCerveza(self, heladera):
         if self.cervezasQueToma == 'cerveza':
-            return heladera.sacar( 'lata' if (randint(0, 10) % 2 == 0) else 'botella')
+            tipo = 'lata' if (randint(0, 10) % 2 == 0) else 'botella'
+            return heladera.sacar(tipo) or heladera.sacar('botella' if tipo == 'lata' else 'lata')
         else:
             return heladera.sacar(self.cervezasQueToma)
 
@@ -240,41 +194,92 @@ class Bebedor(threading.Thread):
 
 # ------------------------------------------------------------------------------------------------ #
 
-def crearHeladeras():
-    heladeras = []
-    for i in range(cantidad['heladeras']):
-        heladeras.append(Heladera(id=i))
-    return heladeras
-
-def crearBebedores():
-    bebedores = []
-    for i in range(cantidad['bebedores']):
-        limite = randint(1, 10)
-        x = randint(1, 30) % 3
-        cervezasQueToma = 'botella' if x==0 else ( 'lata' if x==1 else 'cerveza')
-        bebedores.append( Bebedor(cervezasQueToma, limite, i))
-    return bebedores
+class Simulacion:
+    # Una noche del bar con su deposito, heladeras, proveedor, repositor y bebedores. Armarla no larga
+    # ningun thread: correr() abre el local, lo cierra a los frecuencia['local'] segundos (o cuando
+    # alguien llama a detener()) y espera a que terminen todos antes de volver.
+    def __init__(self, cantidad=cantidad, frecuencia=frecuencia):
+        self.cantidad = dict(cantidad)
+        self.frecuencia = dict(frecuencia)
+        self.localAbierto = False
+        self.detenida = threading.Event()
+        self.cerrado = threading.Event()        # se activa al cerrar el local y corta las esperas entre vueltas de los threads
+        self.heladerasLlenas = threading.Event()    # los bebedores esperan a que el repositor llene las heladeras por primera vez
+        self.monitor = {
+            'repositor': threading.Condition()
+        }
+        self.deposito = Deposito()
+        self.heladeras = self.crearHeladeras()
+        self.proveedor = Proveedor(self)
+        self.repositor = Repositor(self)
+        self.bebedores = self.crearBebedores()
+
+    def crearHeladeras(self):
+        heladeras = []
+        for i in range(self.cantidad['heladeras']):
+            heladeras.append(Heladera(id=i))
+        return heladeras
+
+    def crearBebedores(self):
+        bebedores = []
+        for i in range(self.cantidad['bebedores']):
+            limite = randint(1, 10)
+            x = randint(1, 30) % 3
+            cervezasQueToma = 'botella' if x==0 else ( 'lata' if x==1 else 'cerveza')
+            bebedores.append( Bebedor(self, cervezasQueToma, limite, i))
+        return bebedores
+
+    def correr(self):
+        self.localAbierto = True
+        logging.info(f'LOCAL ABIERTO !')
+
+        self.proveedor.start()
+        self.repositor.start()
+        for beberor in self.bebedores:
+            beberor.start()
+        self.detenida.wait( self.frecuencia['local'] )
+
+        self.localAbierto = False
+        self.cerrado.set()
+        logging.info(f'LOCAL CERRADO !')
+
+        self.heladerasLlenas.set()
+        for key in self.monitor.keys():
+            with self.monitor[key]:
+                self.monitor[key].notify_all()
+        for heladera in self.heladeras:
+            heladera.despertarBebedores()
+
+        plazo = time.monotonic() + self.frecuencia['cierre']
+        for actor in [self.proveedor, self.repositor] + self.bebedores:
+            actor.join( max(0, plazo - time.monotonic()) )
+            if actor.is_alive():
+                logging.warning(f'{actor.name} no termino antes del plazo de cierre')
+        logging.info(f'Cerrado en {self.frecuencia["cierre"] - (plazo - time.monotonic()):.3f} segundos')
+        return self
+
+    def detener(self):
+        self.detenida.set()
+
+    def resultado(self):
+        return {
+            'entregadas': self.proveedor.entregadas,
+            'tomadas': sum(map(lambda bebedor: bebedor.cervezasTomadas, self.bebedores)),
+            'pinchadas': self.repositor.pinchadasSacadas
+        }
 
 # ------------------------------------------------------------------------------------------------ #
 
-deposito = Deposito()
-heladeras = crearHeladeras()
-proveedor = Proveedor()
-repositor = Repositor()
-bebedores = crearBebedores()
-
-localAbierto = True
-logging.info(f'LOCAL ABIERTO !')
-
-proveedor.start()
-repositor.start()
-for beberor in bebedores:
-    beberor.start()
-time.sleep( frecuencia['local'])
+if __name__ == '__main__':
+    from colorama import init, Fore
 
-localAbierto = False
-logging.info(f'LOCAL CERRADO !')
+    init(convert=(os.name == 'nt'))
+    logging.basicConfig(format='%(asctime)s.%(msecs)03d [%(threadName)s] - %(message)s', datefmt='%H:%M:%S', level=logging.INFO)
+    colors.update({
+        'repositor': Fore.GREEN,    # color de Repositor
+        'proveedor': Fore.YELLOW,   # color de Provedor
+        'bebedor': Fore.MAGENTA,    # color de Bebedores
+        'reset': Fore.WHITE         # vuelve a poner el color en blanco
+    })
 
-for key in monitor.keys():
-    with  monitor[key]:
-        monitor[key].notify()
+    Simulacion(cantidad, frecuencia).correr()
@@ -1,135 +1,819 @@
 import os
+import sys
+import mmap
 import time
+import struct
 import logging
 import threading
-from random import randint
-from colorama import init , Fore
+import itertools
+import queue
+import heapq
+import pstats
+import profile
+import cProfile
+from bisect import bisect_left
+from random import randint, random, choices, expovariate
+from collections import deque
 
 # ------------------------------------------------------------------------------------------------ #
 
-init(convert=(os.name == 'nt'))
-logging.basicConfig(format='%(asctime)s.%(msecs)03d [%(threadName)s] - %(message)s', datefmt='%H:%M:%S', level=logging.INFO)
+def rolActual():
+    return getattr(threading.current_thread(), 'rol', 'local')     # los threads del bar dicen su rol, el resto es el local
+
+class Metricas:
+    # Contadores e histogramas de tiempos de los locks y monitores, separados por rol del thread.
+    # Se pueden mostrar mientras el local esta abierto o al cerrarlo.
+    limites = [0.0001, 0.001, 0.01, 0.1, 1, 10]    # limites de los baldes de los histogramas [Segundos]
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.contadores = {}    # (primitiva, metrica, rol) -> cantidad
+        self.histogramas = {}   # (primitiva, metrica, rol) -> cantidad, total, maximo y baldes
+
+    def contar(self, primitiva, metrica, cantidad=1):
+        clave = (primitiva, metrica, rolActual())
+        with self.lock:
+            self.contadores[clave] = self.contadores.get(clave, 0) + cantidad
+
+    def registrar(self, primitiva, metrica, segundos):
+        clave = (primitiva, metrica, rolActual())
+        with self.lock:
+            if clave not in self.histogramas:
+                self.histogramas[clave] = {'cantidad': 0, 'total': 0, 'maximo': 0, 'baldes': [0] * (len(self.limites) + 1)}
+            histograma = self.histogramas[clave]
+            histograma['cantidad'] += 1
+            histograma['total'] += segundos
+            histograma['maximo'] = max(histograma['maximo'], segundos)
+            histograma['baldes'][bisect_left(self.limites, segundos)] += 1
+
+    def resumen(self):
+        with self.lock:
+            return dict(self.contadores), {clave: dict(histograma, baldes=list(histograma['baldes'])) for clave, histograma in self.histogramas.items()}
+
+    def percentil(self, histograma, p):
+        # limite del balde en el que cae el percentil, el ultimo balde no tiene limite y usa el maximo
+        acumulado = 0
+        for limite, cantidad in zip(self.limites + [histograma['maximo']], histograma['baldes']):
+            acumulado += cantidad
+            if acumulado >= p / 100 * histograma['cantidad']:
+                return min(limite, histograma['maximo'])
+        return histograma['maximo']
+
+    def mostrar(self):
+        contadores, histogramas = self.resumen()
+        for (primitiva, metrica, rol), cantidad in sorted(contadores.items()):
+            logging.info(f'METRICAS > {primitiva} {metrica} [{rol}]: {cantidad}')
+        for (primitiva, metrica, rol), histograma in sorted(histogramas.items()):
+            logging.info(f'METRICAS > {primitiva} {metrica} [{rol}]: {histograma["cantidad"]} veces, media {1000 * histograma["total"] / histograma["cantidad"]:.3f}ms, p99 <= {1000 * self.percentil(histograma, 99):.3f}ms, maximo {1000 * histograma["maximo"]:.3f}ms')
+
+class CandadoMedido:
+    # RLock que registra cuanto se espera para tomarlo y cuanto se lo tiene, desde que lo toma el with
+    # de mas afuera hasta que lo suelta o hasta que un wait de sus Condition lo suelta
+    def __init__(self, nombre, metricas):
+        self.nombre = nombre
+        self.metricas = metricas
+        self.lock = threading.RLock()
+        self.tomado = threading.local()     # cuantas veces lo tomo este thread y desde cuando lo tiene
+
+    def acquire(self, blocking=True, timeout=-1):
+        profundidad = getattr(self.tomado, 'profundidad', 0)
+        inicio = time.perf_counter()
+        tomado = self.lock.acquire(blocking, timeout)
+        if tomado:
+            if profundidad == 0:
+                ahora = time.perf_counter()
+                self.metricas.registrar(self.nombre, 'espera del lock', ahora - inicio)
+                self.tomado.desde = ahora
+            self.tomado.profundidad = profundidad + 1
+        return tomado
+
+    __enter__ = acquire
+
+    def release(self):
+        self.tomado.profundidad -= 1
+        if self.tomado.profundidad == 0:
+            self.metricas.registrar(self.nombre, 'tiempo con el lock', time.perf_counter() - self.tomado.desde)
+        self.lock.release()
+
+    def __exit__(self, *args):
+        self.release()
+
+    # threading.Condition usa estos tres para soltarlo entero en wait y recuperarlo al despertar
+    def _is_owned(self):
+        return self.lock._is_owned()
+
+    def _release_save(self):
+        self.metricas.registrar(self.nombre, 'tiempo con el lock', time.perf_counter() - self.tomado.desde)
+        profundidad, self.tomado.profundidad = self.tomado.profundidad, 0
+        return self.lock._release_save(), profundidad
+
+    def _acquire_restore(self, estado):
+        inicio = time.perf_counter()
+        self.lock._acquire_restore(estado[0])
+        ahora = time.perf_counter()
+        self.metricas.registrar(self.nombre, 'espera del lock', ahora - inicio)
+        self.tomado.desde, self.tomado.profundidad = ahora, estado[1]
+
+class CondicionMedida(threading.Condition):
+    # Condition que registra cuantas veces se espera en wait, cuanto, cuantas vencen por timeout y cuanto
+    # tarda en despertarse cada thread desde el notify que lo desperto. Los tiempos del lock los mide su
+    # CandadoMedido. Cada wait deja su lugar en enEspera en el mismo orden en que threading.Condition
+    # despierta a los que esperan, asi notify sabe a quien le pone la hora.
+    def __init__(self, nombre, metricas, lock=None):
+        super().__init__(lock)
+        self.nombre = nombre
+        self.metricas = metricas
+        self.enEspera = deque()     # un lugar por wait en curso, notify le anota cuando lo desperto
+
+    def wait(self, timeout=None):
+        lugar = [None]
+        self.enEspera.append(lugar)
+        self.metricas.contar(self.nombre, 'waits')
+        inicio = time.perf_counter()
+        despertado = super().wait(timeout)
+        ahora = time.perf_counter()
+        self.metricas.registrar(self.nombre, 'tiempo en wait', ahora - inicio)
+        if lugar[0] is None:
+            self.enEspera.remove(lugar)     # vencio antes de que lo despertaran
+        if not despertado:
+            self.metricas.contar(self.nombre, 'timeouts')
+        elif lugar[0] is not None:
+            self.metricas.registrar(self.nombre, 'notify a despertar', ahora - lugar[0])
+        return despertado
+
+    def notify(self, n=1):
+        super().notify(n)       # primero, asi sin el lock tomado falla antes de tocar enEspera
+        ahora = time.perf_counter()
+        for x in range( min(n, len(self.enEspera)) ):
+            self.enEspera.popleft()[0] = ahora
+        self.metricas.contar(self.nombre, 'notifies')
+
+def candado(nombre, metricas):
+    return CandadoMedido(nombre, metricas) if metricas else threading.RLock()
+
+def condicion(nombre, metricas, lock=None):
+    # sin metricas los monitores son Condition comunes y no pasan por el lock de Metricas
+    return CondicionMedida(nombre, metricas, lock) if metricas else threading.Condition(lock)
+
+class Perfil:
+    # cProfile solo ve el thread que lo activa, asi que cada actor corre su run con su propio perfil y al
+    # terminar se suma al de su rol. Los tiempos son de reloj: lo que un thread pasa bloqueado en un lock
+    # o durmiendo queda en los acquire y sleep de C, separado de lo que gasta en Python.
+    # Desde Python 3.12 cProfile mide todos los threads del interprete a la vez y no se puede separar
+    # por rol, asi que ahi cada actor usa el profile de Python puro, que se engancha con sys.setprofile
+    # solo en su thread (ver porThread). Es varias veces mas lento, pero el reparto por rol es el mismo.
+    categorias = ['cervezas', 'registro', 'esperas', 'resto']
+    porThread = sys.version_info < (3, 12)
+
+    def __init__(self, prefijo):
+        self.prefijo = prefijo      # se graba un {prefijo}.{rol}.pstats por rol
+        self.lock = threading.Lock()
+        self.estadisticas = {}      # rol -> pstats.Stats con los perfiles de todos sus actores
+
+    def envolver(self, actor):
+        run = actor.run
+        def perfilado():
+            if not self.porThread:
+                perfil = profile.Profile(time.perf_counter)
+                try:
+                    return perfil.runcall(run)
+                finally:
+                    self.agregar(actor.rol, perfil)
+            perfil = cProfile.Profile()
+            try:
+                perfil.enable()
+            except ValueError:      # otra herramienta ya tiene un perfil activo
+                logging.warning(f'PERFIL > no se pudo perfilar {actor.name}, ya hay otro perfil activo')
+                return run()
+            try:
+                run()
+            finally:
+                perfil.disable()
+                self.agregar(actor.rol, perfil)
+        actor.run = perfilado
+
+    def agregar(self, rol, perfil):
+        with self.lock:
+            if rol in self.estadisticas:
+                self.estadisticas[rol].add(perfil)
+            else:
+                self.estadisticas[rol] = pstats.Stats(perfil)
+
+    def categoria(self, archivo, linea, funcion):
+        # cervezas: Cerveza, PackDeCervezas y AnilloDeCervezas; registro: emitir, trazar, la traza y el
+        # modulo logging; esperas: locks, conditions, colas y sleeps de C; resto: todo lo demas.
+        # cProfile nombra las funciones de C con archivo '~' y profile con archivo '' y el nombre solo,
+        # asi que ahi el get de las colas no se distingue del de un dict y cuenta como espera igual.
+        if (archivo, linea) in codigosDeCervezas():
+            return 'cervezas'
+        if (archivo, linea) in codigosDeRegistro() or os.path.dirname(archivo) == os.path.dirname(logging.__file__):
+            return 'registro'
+        if archivo == '~' and any(bloqueante in funcion for bloqueante in ('acquire', 'sleep', "'get' of '_queue")):
+            return 'esperas'
+        if archivo == '' and funcion in ('acquire', 'sleep', 'get'):
+            return 'esperas'
+        return 'resto'
+
+    def reparto(self, estadisticas):
+        tiempos = dict.fromkeys(self.categorias, 0)
+        for (archivo, linea, funcion), (primitivas, llamadas, propio, acumulado, llamadores) in estadisticas.stats.items():
+            tiempos[self.categoria(archivo, linea, funcion)] += propio
+        return tiempos
+
+    def mostrar(self):
+        for rol, estadisticas in sorted(self.estadisticas.items()):
+            tiempos = self.reparto(estadisticas)
+            total = sum(tiempos.values()) or 1
+            logging.info(f'PERFIL > {rol}: {total:.3f}s, ' + ', '.join(f'{categoria} {100 * tiempos[categoria] / total:.1f}%' for categoria in self.categorias))
+
+    def guardar(self):
+        for rol, estadisticas in self.estadisticas.items():
+            estadisticas.dump_stats(f'{self.prefijo}.{rol}.pstats')
+
+def codigos(*funciones):
+    return {(funcion.__code__.co_filename, funcion.__code__.co_firstlineno) for funcion in funciones}
+
+def codigosDeCervezas():
+    return codigos(Cerveza.__new__, *[metodo for clase in (PackDeCervezas, AnilloDeCervezas) for metodo in vars(clase).values() if callable(metodo)])
+
+def codigosDeRegistro():
+    return codigos(Simulacion.emitir, Simulacion.avisarReparto, Simulacion.trazar, Traza.escribir)
+
+# ------------------------------------------------------------------------------------------------ #
 
 colors = {
-    'repositor': Fore.GREEN,    # color de Repositor
-    'proveedor': Fore.YELLOW,   # color de Provedor
-    'bebedor': Fore.MAGENTA,    # color de Bebedores
-    'reset': Fore.WHITE         # vuelve a poner el color en blanco
+    'repositor': '',    # se completan con colorama solo al correr desde la terminal
+    'proveedor': '',
+    'bebedor': '',
+    'reset': ''
 }
 cantidad = {
     'heladeras': 3,
-    'bebedores': 5
+    'bebedores': 5,
+    'repositores': 1,
+    'proveedores': 1
 }
 frecuencia = {
-    'repositor': 2, # frecuencia de entrega de paquetes de cerveza [Segundos]
     'proveedor': 3, # frecuencia de control de heladeras [Segundos]
     'bebedor': 2,   # frecuencia de consumo de cerveza de los clientes [Segundos]
-    'local': 60     # Tiempo que el local esta abierto [Segundos], Si es muy corto los threads no terminan de cumplir sus tareas
+    'cierre': 1,    # plazo para que terminen los threads despues de cerrar el local [Segundos]
+    'local': 60,    # Tiempo que el local esta abierto [Segundos], Si es muy corto los threads no terminan de cumplir sus tareas
+    'metricas': 0   # cada cuanto mostrar las metricas de los locks con el local abierto [Segundos], 0 = solo al cerrar (con registro['metricas'])
+}
+eleccion = 'stock'      # como eligen heladera los bebedores: 'stock' (una que tenga lo que toman) o 'azar'
+capacidadDeposito = {'lata': 300, 'botella': 300}   # lugares del deposito por tipo de envase, None = sin limite
+umbral = {'lata': 5, 'botella': 3}     # por debajo de este stock la heladera le avisa al repositor que la reponga
+desborde = 'esperar'    # lo que no entra en el deposito: 'esperar' que se haga lugar (hasta la proxima entrega) o 'tirar'
+llegadas = {
+    'tasa': 0,          # bebedores que llegan por segundo ademas de los cantidad['bebedores'] del principio, 0 = ninguno
+    'rampa': 0,         # cuanto sube la tasa por cada segundo que pasa [bebedores/s por segundo]
+    'gustos': {'botella': 1, 'lata': 1, 'cerveza': 1},     # proporcion de cada gusto entre los que llegan
+    'limite': (1, 10),  # cada uno toma entre estas cervezas y se va
+    'pileta': 2000,     # maximo de threads atendiendo a los que llegan, si estan todos ocupados se espera en la puerta
+    'ventana': 1        # cada cuanto se anotan las cervezas por segundo y las esperas [Segundos]
 }
-monitor = {
-    'repositor': threading.Condition(),
-    'bebedores': threading.Condition()
+registro = {
+    'eventos': True,    # False para no mostrar nada de lo que hacen los actores, por ejemplo en benchmarks
+    'muestreo': 1,      # se muestra en promedio 1 de cada N eventos
+    'traza': None,      # archivo donde grabar la traza binaria de la noche (ver reproducir.py), None = sin traza
+    'perfil': None,     # prefijo de los archivos .pstats con el perfil de cada rol (ver Perfil), None = sin perfil
+    'metricas': False   # True para medir los locks y monitores (ver Metricas), cada operacion pasa por un lock global
 }
-semaforo = threading.Semaphore(2)
+mensajes = {
+    'entrega': 'Entregue un paquete de {cantidad} cervezas',
+    'reparto': '{cantidad} {tipo}s en Heladera[{heladera}]',
+    'sinStock': 'Sin stock de {tipo}s para reponer, esperando proveedor...',
+    'llena': 'Heladera[{heladera}] llena',
+    'pinchadas': '{cantidad} latas pinchadas sacadas de Heladera[{heladera}]',
+    'hola': 'Hola vengo a tomar {tipo}s, puedo tomar hasta {cantidad}!',
+    'esperando': 'No hay {tipo}s en la heladera[{heladera}], esperando repositor...',
+    'pinchada': 'Saque una lata pinchada de la heladera[{heladera}], Voy a sacar otra...',
+    'tiradas': 'El deposito esta lleno, tire {cantidad} cervezas que no entraban',
+    'tomada': 'Me tome una {tipo}, llevo tomadas {cantidad} cervezas...',
+    'dormir': 'No puedo tomar más, me voy a dormir...'
+}
+
+# ------------------------------------------------------------------------------------------------ #
+
+class Escritor(threading.Thread):
+    # Saca de la cola los eventos que emiten los actores y les pone formato y colores
+    def __init__(self, simulacion):
+        super().__init__(name='Escritor', daemon=True)
+        self.simulacion = simulacion
+
+    def run(self):
+        while True:
+            evento = self.simulacion.eventos.get()
+            if evento is None:
+                break
+            if not logging.getLogger().isEnabledFor(logging.INFO):
+                continue
+            momento, thread, rol, id, nombre, heladera, tipo, cantidad = evento
+            encabezado = rol.upper() if id is None else f'{rol.upper()}[{id}]'
+            mensaje = mensajes[nombre].format(heladera=heladera, tipo=tipo, cantidad=cantidad)
+            logging.getLogger().handle(logging.makeLogRecord({
+                'name': 'root',
+                'msg': f'{colors[rol]}{encabezado} > {mensaje}{colors["reset"]}',
+                'levelno': logging.INFO,
+                'levelname': 'INFO',
+                'created': momento,
+                'msecs': (momento % 1) * 1000,
+                'threadName': thread
+            }))
+
+class Traza:
+    # Archivo binario de solo agregar con cada cambio de estado de la noche, escrito sobre un mmap que
+    # se agranda al doble cuando se llena. reproducir.py lo lee con este mismo formato y estas tablas.
+    marca = b'CERV'
+    cabecera = struct.Struct('<4sHd')       # marca, version, inicio [time.time()]
+    version = 2                             # la 2 agranda el id a 32 bits, la Puerta numera sin limite
+    registro = struct.Struct('<fBBIHBh')    # segundos desde el inicio, evento, rol, id, heladera, tipo, cantidad
+    anteriores = {1: struct.Struct('<fBBHHBh')}     # registros de versiones viejas que todavia se pueden leer
+    eventos = ['entrega', 'deposito', 'retiro', 'colocar', 'tomada', 'pinchada', 'pinchadas', 'esperando', 'finEspera']
+    roles = ['local', 'proveedor', 'repositor', 'bebedor']
+    tipos = ['lata', 'botella', 'cerveza']
+    ninguno = 0xFF          # tipo sin valor, la heladera sin valor es 0xFFFF
+
+    def __init__(self, archivo, tamanio=1 << 20):
+        self.lock = threading.Lock()
+        self.codigos = {nombre: codigo for nombres in (self.eventos, self.roles, self.tipos) for codigo, nombre in enumerate(nombres)}
+        self.inicio = time.time()
+        self.archivo = open(archivo, 'w+b')
+        self.archivo.truncate(tamanio)
+        self.mapa = mmap.mmap(self.archivo.fileno(), tamanio)
+        self.cabecera.pack_into(self.mapa, 0, self.marca, self.version, self.inicio)
+        self.posicion = self.cabecera.size
+
+    def escribir(self, evento, rol, id, heladera, tipo, cantidad):
+        with self.lock:
+            if self.mapa is None:       # algun thread que sigue despues de cerrar el local
+                return
+            if self.posicion + self.registro.size > len(self.mapa):
+                self.mapa.resize(2 * len(self.mapa))
+            self.registro.pack_into(self.mapa, self.posicion, time.time() - self.inicio, self.codigos[evento], self.codigos[rol], id,
+                0xFFFF if heladera is None else heladera, self.ninguno if tipo is None else self.codigos[tipo], cantidad)
+            self.posicion += self.registro.size
+
+    def cerrar(self):
+        with self.lock:
+            self.mapa.flush()
+            self.mapa.close()
+            self.mapa = None
+            self.archivo.truncate(self.posicion)
+            self.archivo.close()
+
 # ------------------------------------------------------------------------------------------------ #
 
 class Cerveza:
-    def __init__(self, tipo='cerveza', pinchada=False):
-        self.tipo = tipo
-        self.pinchada = pinchada
+    # Las cervezas no cambian una vez producidas, asi que hay un solo objeto por cada (tipo, pinchada)
+    # y el deposito y las heladeras solo guardan referencias a esos objetos compartidos.
+    __slots__ = ('tipo', 'pinchada')
+    compartidas = {}
+
+    def __new__(cls, tipo='cerveza', pinchada=False):
+        cerveza = cls.compartidas.get((tipo, pinchada))
+        if cerveza is None:
+            cerveza = super().__new__(cls)
+            cerveza.tipo = tipo
+            cerveza.pinchada = pinchada
+            # setdefault es atomico: si dos hilos la crean a la vez los dos se quedan con la primera
+            cerveza = cls.compartidas.setdefault((tipo, pinchada), cerveza)
+        return cerveza
 
 class PackDeCervezas:
+    # Un balde por tipo de envase con las referencias a las cervezas compartidas en orden de llegada, y
+    # cuantas de cada balde estan pinchadas: si no hay pinchadas sacarlas no recorre nada.
     def __init__(self):
-        self.cervezas= []
+        self.cervezas = {}      # tipo de envase -> cervezas compartidas en orden de llegada
+        self.pinchadas = {}     # tipo de envase -> cuantas de su balde estan pinchadas
 
     def set(self, listaDeCervezas):
-        self.cervezas = listaDeCervezas
+        self.clear()
+        self.extend(listaDeCervezas)
 
     def get(self):
-        return self.cervezas
+        return [cerveza for balde in self.cervezas.values() for cerveza in balde]
     
     def getTipos(self):
-        return list(map(lambda cerveza: cerveza.tipo ,self.cervezas))
+        return list(map(lambda cerveza: cerveza.tipo ,self.get()))
 
     def append(self, unaCerveza):
-        self.cervezas.append(unaCerveza)
+        if unaCerveza.tipo not in self.cervezas:
+            self.cervezas[unaCerveza.tipo] = deque()
+        self.cervezas[unaCerveza.tipo].append(unaCerveza)
+        if unaCerveza.pinchada:
+            self.pinchadas[unaCerveza.tipo] = self.pinchadas.get(unaCerveza.tipo, 0) + 1
+
+    def extend(self, listaDeCervezas):
+        for cerveza in listaDeCervezas:
+            self.append(cerveza)
     
     def clear(self):
         self.cervezas.clear()
+        self.pinchadas.clear()
 
     def remove(self, unTipoDeCerveza):
-        return self.cervezas.pop( self.getTipos().index(unTipoDeCerveza))
+        cerveza = self.cervezas[unTipoDeCerveza].popleft()
+        if cerveza.pinchada:
+            self.pinchadas[unTipoDeCerveza] -= 1
+        return cerveza
+
+    def removeMany(self, unTipoDeCerveza, cantidad):
+        return [self.remove(unTipoDeCerveza) for x in range( min(cantidad, self.count(unTipoDeCerveza)) )]
+
+    def removeAll(self, unaCerveza):
+        # las pinchadas (o las sanas) de un tipo se cuentan sin recorrer el balde, y solo si hay que
+        # sacar algunas y dejar otras se arma el balde de nuevo con las que quedan
+        tipo = unaCerveza.tipo
+        balde = self.cervezas.get(tipo, ())
+        pinchadas = self.pinchadas.get(tipo, 0)
+        sacadas = pinchadas if unaCerveza.pinchada else len(balde) - pinchadas
+        if sacadas == len(balde):
+            self.cervezas.pop(tipo, None)
+            self.pinchadas.pop(tipo, None)
+        elif sacadas:
+            self.cervezas[tipo] = deque(cerveza for cerveza in balde if cerveza is not unaCerveza)
+            self.pinchadas[tipo] = 0 if unaCerveza.pinchada else pinchadas
+        return sacadas
 
     def pop(self, index = 0):
-        return self.cervezas.pop( index )
+        index %= self.size()
+        cerveza = self.get()[index]
+        for tipo, balde in self.cervezas.items():
+            if index < len(balde):
+                del balde[index]
+                break
+            index -= len(balde)
+        if cerveza.pinchada:
+            self.pinchadas[cerveza.tipo] -= 1
+        return cerveza
 
     def size(self):
-        return len(self.cervezas)
+        return sum(map(len, self.cervezas.values()))
 
     def contains(self, unTipoDeCerveza):
-        return unTipoDeCerveza in self.getTipos()
+        return self.count(unTipoDeCerveza) > 0
     
     def count(self, unTipoDeCerveza):
-        return self.getTipos().count(unTipoDeCerveza)
+        return len(self.cervezas.get(unTipoDeCerveza, ()))
+
+class AnilloDeCervezas:
+    # Pack de capacidad fija: un buffer circular por tipo de envase, reservado entero al armarlo, asi el
+    # deposito no crece por mas larga que sea la noche. Tiene la misma interfaz que PackDeCervezas.
+    def __init__(self, capacidad):
+        self.capacidad = dict(capacidad)
+        self.anillos = {tipo: [None] * lugares for tipo, lugares in self.capacidad.items()}
+        self.inicios = {tipo: 0 for tipo in self.capacidad}
+        self.cantidades = {tipo: 0 for tipo in self.capacidad}
+
+    def set(self, listaDeCervezas):
+        self.clear()
+        self.extend(listaDeCervezas)
+
+    def get(self):
+        return [self.anillos[tipo][(self.inicios[tipo] + i) % self.capacidad[tipo]] for tipo in self.capacidad for i in range(self.cantidades[tipo])]
+
+    def getTipos(self):
+        return list(map(lambda cerveza: cerveza.tipo ,self.get()))
+
+    def append(self, unaCerveza):
+        tipo = unaCerveza.tipo
+        if not self.espaciosPara(tipo):
+            return False
+        self.anillos[tipo][(self.inicios[tipo] + self.cantidades[tipo]) % self.capacidad[tipo]] = unaCerveza
+        self.cantidades[tipo] += 1
+        return True
+
+    def extend(self, listaDeCervezas):
+        for cerveza in listaDeCervezas:
+            self.append(cerveza)
+
+    def clear(self):
+        for tipo, anillo in self.anillos.items():
+            anillo[:] = [None] * len(anillo)
+            self.inicios[tipo] = 0
+            self.cantidades[tipo] = 0
+
+    def remove(self, unTipoDeCerveza):
+        anillo, inicio = self.anillos[unTipoDeCerveza], self.inicios[unTipoDeCerveza]
+        cerveza = anillo[inicio]
+        anillo[inicio] = None
+        self.inicios[unTipoDeCerveza] = (inicio + 1) % self.capacidad[unTipoDeCerveza]
+        self.cantidades[unTipoDeCerveza] -= 1
+        return cerveza
+
+    def removeMany(self, unTipoDeCerveza, cantidad):
+        return [self.remove(unTipoDeCerveza) for x in range( min(cantidad, self.count(unTipoDeCerveza)) )]
+
+    def size(self):
+        return sum(self.cantidades.values())
+
+    def contains(self, unTipoDeCerveza):
+        return self.count(unTipoDeCerveza) > 0
+
+    def count(self, unTipoDeCerveza):
+        return self.cantidades.get(unTipoDeCerveza, 0)
+
+    def espaciosPara(self, unTipoDeCerveza):
+        return self.capacidad.get(unTipoDeCerveza, 0) - self.count(unTipoDeCerveza)
 
 # ------------------------------------------------------------------------------------------------ #
 
 class Deposito:
-    def __init__(self):
-        self.cervezas = PackDeCervezas()
+    # Tambien lo usan los otros scripts de la fiesta sin simulacion, y entonces no se traza nada
+    def __init__(self, simulacion=None, capacidad=None):
+        self.simulacion = simulacion
+        self.cervezas = AnilloDeCervezas(capacidad) if capacidad else PackDeCervezas()
+
+    def colocar(self, packDeCervezas, tipos=['lata', 'botella']):
+        for tipo in tipos:      # saca del pack lo que entra, el resto queda en el pack
+            cervezas = packDeCervezas.removeMany(tipo, self.espaciosPara(tipo))
+            if cervezas and self.simulacion:
+                self.simulacion.trazar('deposito', tipo=tipo, cantidad=len(cervezas))
+            self.cervezas.extend( cervezas )
+
+    def sacar(self, unTipoDeCerveza, cantidad=None):
+        if cantidad is None:
+            return self.cervezas.remove( unTipoDeCerveza ) if (self.cervezas.contains(unTipoDeCerveza)) else False
+        cervezas = PackDeCervezas()
+        cervezas.extend( self.cervezas.removeMany(unTipoDeCerveza, cantidad) )
+        return cervezas, cantidad - cervezas.size()     # lo que se pudo sacar y lo que falto
+
+    def espaciosPara(self, unTipoDeCerveza):
+        return self.cervezas.espaciosPara(unTipoDeCerveza) if isinstance(self.cervezas, AnilloDeCervezas) else float('inf')
+
+class DepositoPorEnvase:
+    # El deposito del bar partido en un estante por tipo de envase, cada uno con su lock y sus monitores.
+    # Las latas y las botellas nunca comparten lugar, asi que una entrega o un retiro de botellas no frena
+    # a quien espera latas, y un repositor esperando latas solo se despierta cuando llegan latas.
+    def __init__(self, simulacion, capacidad=None):
+        self.simulacion = simulacion
+        self.estantes = {tipo: Deposito(simulacion, {tipo: capacidad[tipo]} if capacidad else None) for tipo in ['lata', 'botella']}
+        self.lock = {tipo: candado(f'deposito.lock[{tipo}]', simulacion.metricas) for tipo in self.estantes}
+        self.hayStock = {tipo: condicion(f'deposito.hayStock[{tipo}]', simulacion.metricas, self.lock[tipo]) for tipo in self.estantes}    # llegaron cervezas
+        self.hayLugar = {tipo: condicion(f'deposito.hayLugar[{tipo}]', simulacion.metricas, self.lock[tipo]) for tipo in self.estantes}    # se hizo lugar
+        self.pendientes = {tipo: set() for tipo in self.estantes}       # heladeras que no se pudieron completar por falta de stock
+
+    def colocar(self, packDeCervezas, tipos=['lata', 'botella']):
+        # de a un estante por vez, nunca con dos locks tomados
+        for tipo in tipos:
+            if packDeCervezas.contains(tipo):
+                with self.hayStock[tipo]:
+                    self.estantes[tipo].colocar(packDeCervezas, [tipo])
+                    self.hayStock[tipo].notify_all()
+                    for heladera in self.pendientes[tipo]:
+                        heladera.avisarRepositor()
+                    self.pendientes[tipo].clear()
 
-    def colocar(self, packDeCervezas):
-        for cerveza in packDeCervezas.cervezas:
-            self.cervezas.append( cerveza )
+    def sacar(self, unTipoDeCerveza, cantidad=None):
+        with self.lock[unTipoDeCerveza]:
+            cervezas = self.estantes[unTipoDeCerveza].sacar(unTipoDeCerveza, cantidad)
+            self.hayLugar[unTipoDeCerveza].notify_all()
+            return cervezas
+
+    def count(self, unTipoDeCerveza):
+        return self.estantes[unTipoDeCerveza].cervezas.count(unTipoDeCerveza)
 
-    def sacar(self, unTipoDeCerveza):
-        return self.cervezas.remove( unTipoDeCerveza ) if (self.cervezas.contains(unTipoDeCerveza)) else False
+    def despertar(self):
+        for tipo in self.estantes:
+            with self.hayStock[tipo]:
+                self.hayStock[tipo].notify_all()
+                self.hayLugar[tipo].notify_all()
 
 # ------------------------------------------------------------------------------------------------ #
 
-class Heladera(Deposito):
-    def __init__(self, capacidadLatas=15, capacidadBotellas=10, id=0):
-        super().__init__()
+class HeladeraBase(Deposito):
+    # Lo que tienen en comun las heladeras de todos los scripts; cada uno le agrega sus locks o
+    # condiciones y avisa a su manera al colocar y sacar
+    def __init__(self, simulacion=None, capacidadLatas=15, capacidadBotellas=10, id=0):
+        super().__init__(simulacion)
         self.id = id
         self.capacidad = {'lata': capacidadLatas,'botella': capacidadBotellas}
         self.enchufada = False
         self.enfriadoRapido = False
-    
-    def colocar(self, unaCerveza):
-        if( self.hayEspacioPara(unaCerveza.tipo) ):
-            self.cervezas.append( unaCerveza )
 
     def hayEspacioPara(self, unTipoDeCerveza):
         return self.cervezas.count(unTipoDeCerveza) < self.capacidad[unTipoDeCerveza]
 
     def espaciosPara(self, unTipoDeCerveza):
         return self.capacidad[unTipoDeCerveza] - self.cervezas.count(unTipoDeCerveza)
-    
+
     def estaLlena(self):
         return self.cervezas.size() == (self.capacidad['lata'] + self.capacidad['botella'])
 
+class Heladera(HeladeraBase):
+    def __init__(self, simulacion, capacidadLatas=15, capacidadBotellas=10, id=0):
+        super().__init__(simulacion, capacidadLatas, capacidadBotellas, id)
+        self.lock = candado(f'heladera[{id}].lock', simulacion.metricas)
+        self.hayStock = {gusto: condicion(f'heladera[{id}].hayStock[{gusto}]', simulacion.metricas, self.lock) for gusto in ['lata', 'botella', 'cerveza']}  # un monitor por gusto de bebedor
+        self.cola = None            # ColaDeHeladeras a la que hay que avisarle cada cambio de stock
+        self.indice = None          # IndiceDeStock al que hay que avisarle cada cambio de stock
+        self.reservada = threading.Lock()   # la toma el repositor que la esta llenando
+        self.porReponer = False     # ya esta en simulacion.heladerasPorReponer
+        self.otraVuelta = False     # otro repositor la saco de la cola mientras estaba reservada
+    
+    def colocar(self, packDeCervezas, cantidades=None):
+        with self.lock:
+            for tipo in self.capacidad:     # saca del pack todo lo que entra (o lo que diga cantidades), el resto queda en el pack
+                cervezas = packDeCervezas.removeMany(tipo, self.espaciosPara(tipo) if cantidades is None else cantidades[tipo])
+                self.cervezas.extend( cervezas )
+                self.avisarStock(tipo, len(cervezas))
+                if cervezas:
+                    self.simulacion.trazar('colocar', heladera=self.id, tipo=tipo, cantidad=len(cervezas))
+                if Cerveza('lata', True) in cervezas:
+                    self.avisarRepositor()      # para que saque las pinchadas
+            self.actualizarPrioridad()
+
+    def sacar(self, unTipoDeCerveza, cantidad=None):
+        with self.lock:
+            cervezas = super().sacar(unTipoDeCerveza, cantidad)
+            self.actualizarPrioridad()
+            if cantidad is None and cervezas:
+                self.simulacion.trazar('pinchada' if cervezas.pinchada else 'tomada', heladera=self.id, tipo=unTipoDeCerveza)
+                self.controlarStock(unTipoDeCerveza)
+            return cervezas
+
+    def controlarStock(self, unTipoDeCerveza):
+        if self.cervezas.count(unTipoDeCerveza) < self.simulacion.umbral[unTipoDeCerveza]:
+            self.avisarRepositor()
+
+    def avisarRepositor(self):
+        # la heladera se anota una sola vez en la cola de los repositores hasta que alguno la atienda
+        with self.lock:
+            if not self.porReponer:
+                self.porReponer = True
+                self.simulacion.heladerasPorReponer.put(self)
+
+    def avisarStock(self, unTipoDeCerveza, cantidad):
+        # despierta solo a los bebedores que pueden tomar lo que se acaba de colocar
+        self.hayStock[unTipoDeCerveza].notify(cantidad)
+        self.hayStock['cerveza'].notify(cantidad)
+
+    def despertarBebedores(self):
+        with self.lock:
+            for hayStock in self.hayStock.values():
+                hayStock.notify_all()
+
+    def actualizarPrioridad(self):
+        if self.cola:
+            self.cola.actualizar(self)
+        if self.indice:
+            self.indice.actualizar(self)
+
+    def quitarPinchadas(self):
+        with self.lock:
+            sacadas = self.cervezas.removeAll( Cerveza('lata', True) )
+            if sacadas:
+                self.actualizarPrioridad()
+                self.simulacion.trazar('pinchadas', heladera=self.id, tipo='lata', cantidad=sacadas)
+            return sacadas
+
 # ------------------------------------------------------------------------------------------------ #
 
-class Proveedor(threading.Thread):
+class ColaDeHeladeras:
+    # Heap indexado de heladeras, primero las que tienen menos cervezas y a igual stock la de menor id.
+    # Cada heladera guarda su posicion para poder actualizarla en O(log n) cuando cambia su stock.
     def __init__(self):
-        super().__init__()
+        self.heap = []          # [cervezas en la heladera, id de la heladera]
+        self.posiciones = {}    # id de la heladera -> posicion en el heap
+        self.heladeras = {}     # id de la heladera -> heladera
+        self.lock = threading.Lock()
+
+    def agregar(self, heladera):
+        with self.lock:
+            self.heladeras[heladera.id] = heladera
+            self.posiciones[heladera.id] = len(self.heap)
+            self.heap.append([heladera.cervezas.size(), heladera.id])
+            self.subir(len(self.heap) - 1)
+        heladera.cola = self
+
+    def actualizar(self, heladera):
+        with self.lock:
+            posicion = self.posiciones[heladera.id]
+            self.heap[posicion][0] = heladera.cervezas.size()
+            self.subir(posicion)
+            self.bajar(self.posiciones[heladera.id])
+
+    def ordenadas(self):
+        # Copia del heap tomada con el lock, asi el orden es el de un mismo instante aunque otro thread
+        # cambie el stock despues. La copia ya es un heap: las heladeras salen de a una a medida que se
+        # piden, y quien corta la iteracion (planDeReparto cuando se acaba el pack) paga O(n + k log n).
+        with self.lock:
+            copia = [tuple(entrada) for entrada in self.heap]
+        return self.sacarEnOrden(copia)
+
+    def sacarEnOrden(self, copia):
+        while copia:
+            cervezas, id = heapq.heappop(copia)
+            yield self.heladeras[id]
+
+    def subir(self, posicion):
+        while posicion > 0:
+            padre = (posicion - 1) // 2
+            if self.heap[padre] <= self.heap[posicion]:
+                break
+            self.intercambiar(padre, posicion)
+            posicion = padre
+
+    def bajar(self, posicion):
+        while True:
+            menor = posicion
+            for hijo in (2 * posicion + 1, 2 * posicion + 2):
+                if hijo < len(self.heap) and self.heap[hijo] < self.heap[menor]:
+                    menor = hijo
+            if menor == posicion:
+                break
+            self.intercambiar(menor, posicion)
+            posicion = menor
+
+    def intercambiar(self, i, j):
+        self.heap[i], self.heap[j] = self.heap[j], self.heap[i]
+        self.posiciones[self.heap[i][1]] = i
+        self.posiciones[self.heap[j][1]] = j
+
+class IndiceDeStock:
+    # Para cada gusto de bebedor, las heladeras que tienen algo que le sirve ('cerveza': cualquier envase,
+    # cada heladera una sola vez). Cada lista guarda la posicion de sus heladeras para sacarlas en O(1)
+    # cambiandolas por la ultima, y el lock solo se toma cuando una heladera se queda sin un gusto o lo
+    # vuelve a tener.
+    def __init__(self):
+        self.conStock = {'lata': [], 'botella': [], 'cerveza': []}      # gusto -> heladeras con ese gusto
+        self.posiciones = {'lata': {}, 'botella': {}, 'cerveza': {}}    # gusto -> id de la heladera -> posicion en la lista
+        self.lock = threading.Lock()
+
+    def agregar(self, heladera):
+        heladera.indice = self
+        self.actualizar(heladera)
+
+    def actualizar(self, heladera):
+        for tipo, posiciones in self.posiciones.items():
+            if (heladera.id in posiciones) != self.tiene(heladera, tipo):
+                with self.lock:
+                    if heladera.id in posiciones:
+                        self.sacar(tipo, heladera)
+                    else:
+                        posiciones[heladera.id] = len(self.conStock[tipo])
+                        self.conStock[tipo].append(heladera)
+
+    def tiene(self, heladera, gusto):
+        if gusto == 'cerveza':
+            return heladera.cervezas.contains('lata') or heladera.cervezas.contains('botella')
+        return heladera.cervezas.contains(gusto)
+
+    def sacar(self, tipo, heladera):
+        heladeras, posiciones = self.conStock[tipo], self.posiciones[tipo]
+        posicion = posiciones.pop(heladera.id)
+        ultima = heladeras.pop()
+        if ultima is not heladera:
+            heladeras[posicion] = ultima
+            posiciones[ultima.id] = posicion
+
+    def elegir(self, gusto):
+        # una heladera al azar entre las que tienen lo que toma el bebedor, None si no hay ninguna
+        with self.lock:
+            heladeras = self.conStock[gusto]
+            return heladeras[ randint(0, len(heladeras)-1) ] if heladeras else None
+
+# ------------------------------------------------------------------------------------------------ #
+
+class Proveedor(threading.Thread):
+    rol = 'proveedor'
+
+    def __init__(self, simulacion, id=0):
+        super().__init__(daemon=True)     # si no termina antes del plazo de cierre no traba la salida
+        self.simulacion = simulacion
+        self.id = id
         self.packDeCervezas = PackDeCervezas()
+        self.entregadas = 0
+        self.tiradas = 0
 
     def run(self):
-        global localAbierto, frecuencia
-        semaforo.acquire()
-        while localAbierto:
+        while self.simulacion.localAbierto:
             self.producirCervezas()
             self.entregar()
-            time.sleep( frecuencia['proveedor'] )
-        semaforo.release()
+            self.simulacion.cerrado.wait( self.simulacion.frecuencia['proveedor'] )
 
     def entregar(self):
-        global monitor, deposito
-        with monitor['repositor']:
-            deposito.colocar(self.packDeCervezas)
-            monitor['repositor'].notify()
-        logging.info(f'{colors["proveedor"]}PROVEEDOR > Entregue un paquete de {self.packDeCervezas.size()} cervezas{colors["reset"]}')
+        deposito = self.simulacion.deposito
+        entregadas = self.packDeCervezas.size()
+        self.entregadas += entregadas
+        self.simulacion.trazar('entrega', cantidad=entregadas)
+        plan = self.simulacion.repartir(self.packDeCervezas) if self.simulacion.heladerasLlenas.is_set() else []    # el primer llenado va en orden
+        deposito.colocar(self.packDeCervezas)       # lo que no entro en ninguna heladera
+        # si el deposito esta lleno se espera a que los repositores hagan lugar, pero no mas que hasta
+        # la proxima entrega: lo que siga sin entrar se tira para no frenar al proveedor toda la noche
+        limite = time.monotonic() + self.simulacion.frecuencia['proveedor']
+        for tipo in deposito.estantes:
+            with deposito.hayLugar[tipo]:
+                while self.packDeCervezas.contains(tipo) and self.simulacion.desborde == 'esperar' and self.simulacion.localAbierto and time.monotonic() < limite:
+                    deposito.hayLugar[tipo].wait( limite - time.monotonic() )
+                    deposito.colocar(self.packDeCervezas, [tipo])
+        tiradas = self.packDeCervezas.size()
+        self.tiradas += tiradas
+        self.simulacion.emitir('proveedor', self.id, 'entrega', cantidad=entregadas)
+        self.simulacion.avisarReparto('proveedor', self.id, plan)
+        if tiradas:
+            self.simulacion.emitir('proveedor', self.id, 'tiradas', cantidad=tiradas)
         self.packDeCervezas.clear()
 
     def producirCervezas(self):
@@ -141,150 +825,516 @@ class Proveedor(threading.Thread):
 # ------------------------------------------------------------------------------------------------ #
 
 class Repositor(threading.Thread):
-    def __init__(self):
-        super().__init__()
+    rol = 'repositor'
+
+    def __init__(self, simulacion, id=0):
+        super().__init__(daemon=True)
+        self.simulacion = simulacion
+        self.id = id
         self.cervezas = PackDeCervezas()
+        self.pinchadasSacadas = 0
 
     def run(self):
-        global heladeras
+        heladeras = self.simulacion.heladeras
         for heladera in heladeras:
-            heladera.enchufada = True
-            self.llenar(heladera)
-            heladera.enfriadoRapido = True
+            if heladera.reservada.acquire(blocking=False):     # si la esta llenando otro repositor pasamos a la siguiente
+                heladera.enchufada = True
+                self.llenar(heladera)
+                heladera.enfriadoRapido = True
+                if not self.soltar(heladera):
+                    self.atender(heladera)
+                if all(map(lambda unaHeladera: unaHeladera.enfriadoRapido, heladeras)):
+                    self.simulacion.heladerasLlenas.set()
         self.controlarHeladeras()
 
     def controlarHeladeras(self):
-        global localAbierto, heladeras
-        while localAbierto:
-            with monitor['bebedores']:
-                monitor['bebedores'].notify()
-            self.quitarPinchadas()
-            ordenarHeladeras(heladeras)
-            semaforo.acquire()
-            for heladera in heladeras:
-                if not heladera.estaLlena():
-                    self.llenar(heladera)
-            semaforo.release()
-            time.sleep(frecuencia['repositor'])
+        # en vez de recorrer las heladeras cada tanto, el repositor duerme hasta que alguna avisa que
+        # quedo por debajo del umbral o que le pusieron latas pinchadas, y atiende solo a esa
+        while self.simulacion.localAbierto:
+            heladera = self.simulacion.heladerasPorReponer.get()
+            if heladera is None:
+                break       # cerro el local
+            with heladera.lock:
+                if not heladera.reservada.acquire(blocking=False):
+                    heladera.otraVuelta = True      # la esta llenando otro repositor, que la completa de nuevo al terminar
+                    continue
+            self.atender(heladera)
+
+    def atender(self, heladera):
+        # con la heladera reservada, asi dos repositores nunca la llenan a la vez
+        while True:
+            with heladera.lock:
+                heladera.porReponer = False     # lo que se saque de aca en adelante la vuelve a anotar
+            self.quitarPinchadas(heladera)
+            self.completar(heladera)
+            if self.soltar(heladera):
+                return
 
+    def soltar(self, heladera):
+        # la suelta salvo que otro repositor la haya sacado de la cola mientras tanto: en ese caso hay
+        # que darle otra vuelta. Se decide con el lock de la heladera, el mismo con el que se marca.
+        with heladera.lock:
+            if heladera.otraVuelta and self.simulacion.localAbierto:
+                heladera.otraVuelta = False
+                return False
+            heladera.otraVuelta = False
+            heladera.reservada.release()
+            return True
+
+    def completar(self, heladera):
+        # lo que falta sale de lo que tiene en la mano y del deposito, sin esperar al proveedor: si el
+        # deposito no alcanza la heladera queda pendiente y se vuelve a anotar cuando lleguen cervezas
+        deposito = self.simulacion.deposito
+        for tipo in ['botella', 'lata']:
+            with deposito.hayStock[tipo]:
+                faltan = heladera.espaciosPara(tipo) - self.cervezas.count(tipo)
+                if faltan > 0:
+                    cervezasDelDeposito, faltantes = deposito.sacar(tipo, faltan)
+                    self.retirar(cervezasDelDeposito)
+                    if faltantes:
+                        deposito.pendientes[tipo].add(heladera)
+        enMano = {tipo: self.cervezas.count(tipo) for tipo in ['botella', 'lata']}
+        heladera.colocar( self.cervezas )
+        for tipo, cantidad in enMano.items():
+            if cantidad - self.cervezas.count(tipo):
+                self.simulacion.emitir('repositor', self.id, 'reparto', heladera=heladera.id, tipo=tipo, cantidad=cantidad - self.cervezas.count(tipo))
 
     def traerCervezas(self, unTipoDeCerveza, cantidad):
-        global monitor, deposito
-        for x in range(cantidad):
-            cervezaDelDeposito = deposito.sacar(unTipoDeCerveza)
-            with monitor['repositor']:
-                while not(cervezaDelDeposito) and localAbierto:
-                    logging.info(f'{colors["repositor"]}REPOSITOR > Sin stock de {unTipoDeCerveza}s para reponer, esperando proveedor...{colors["reset"]}')
-                    monitor['repositor'].wait()
-                    cervezaDelDeposito = deposito.sacar(unTipoDeCerveza)
-                self.cervezas.append(cervezaDelDeposito)
+        deposito = self.simulacion.deposito
+        with deposito.hayStock[unTipoDeCerveza]:
+            cervezasDelDeposito, faltantes = deposito.sacar(unTipoDeCerveza, cantidad)
+            self.retirar(cervezasDelDeposito)
+            while faltantes and self.simulacion.localAbierto:
+                self.simulacion.emitir('repositor', self.id, 'sinStock', tipo=unTipoDeCerveza)
+                deposito.hayStock[unTipoDeCerveza].wait()
+                cervezasDelDeposito, faltantes = deposito.sacar(unTipoDeCerveza, faltantes)
+                self.retirar(cervezasDelDeposito)
+
+    def retirar(self, cervezasDelDeposito):
+        if cervezasDelDeposito.size():
+            self.simulacion.trazar('retiro', tipo=cervezasDelDeposito.get()[0].tipo, cantidad=cervezasDelDeposito.size())
+        self.cervezas.extend(cervezasDelDeposito.get())
 
     def reponer(self, unTipoDeCerveza, unaHeladera):
-        while unaHeladera.hayEspacioPara(unTipoDeCerveza):
-            if self.cervezas.contains(unTipoDeCerveza):
-                unaHeladera.colocar( self.cervezas.remove(unTipoDeCerveza) )
-            else:
+        while unaHeladera.hayEspacioPara(unTipoDeCerveza) and self.simulacion.localAbierto:
+            if not self.cervezas.contains(unTipoDeCerveza):
                 self.traerCervezas( unTipoDeCerveza, unaHeladera.espaciosPara(unTipoDeCerveza) )
+            unaHeladera.colocar( self.cervezas )
     
     def llenar(self, heladera):
         self.reponer('botella', heladera)
         self.reponer('lata', heladera)
-        logging.info(f'{colors["repositor"]}REPOSITOR > Heladera[{heladera.id}] llena{colors["reset"]}')
+        self.simulacion.emitir('repositor', self.id, 'llena', heladera=heladera.id)
     
-    def quitarPinchadas(self):
-        for heladera in heladeras:
-            heladera.cervezas.set(list(filter(lambda cerveza: not(cerveza.pinchada), heladera.cervezas.get())))
-            if heladera.espaciosPara('lata') != 0:
-                logging.info(f'{colors["repositor"]}REPOSITOR > {heladera.espaciosPara("lata")} latas pinchadas sacadas de Heladera[{heladera.id}]{colors["reset"]}')
+    def quitarPinchadas(self, heladera):
+        sacadas = heladera.quitarPinchadas()
+        self.pinchadasSacadas += sacadas
+        if sacadas != 0:
+            self.simulacion.emitir('repositor', self.id, 'pinchadas', heladera=heladera.id, cantidad=sacadas)
 
 # ------------------------------------------------------------------------------------------------ #
 
 class Bebedor(threading.Thread):
-    def __init__(self, cervezasQueToma='cerveza', limite=0, id=0):
-        super().__init__()
+    rol = 'bebedor'
+
+    def __init__(self, simulacion, cervezasQueToma='cerveza', limite=0, id=0):
+        super().__init__(daemon=True)
+        self.simulacion = simulacion
         self.id = id
         self.limite = limite
         self.cervezasTomadas = 0
         self.cervezasQueToma = cervezasQueToma
+        self.espera = 0             # segundos esperando que el repositor llene la heladera
 
     def run(self):
-        global frecuencia, heladeras,monitor
-        with monitor['bebedores']:
-            monitor['bebedores'].wait()     # Esopera que el repositor llene las heladeras 
+        self.simulacion.heladerasLlenas.wait()
         self.presentarse()
-        while self.cervezasTomadas < self.limite and localAbierto:
-            self.tomarCerveza( self.elegirHeladera( heladeras ) )
+        while self.cervezasTomadas < self.limite and self.simulacion.localAbierto:
+            self.tomarCerveza( self.elegirHeladera( self.simulacion.heladeras ) )
             if self.cervezasTomadas == self.limite:
-                logging.info(f'{colors["bebedor"]}BEBEDOR[{self.id}] > No puedo tomar más, me voy a dormir...{colors["reset"]}')
-            time.sleep(frecuencia['bebedor'])
+                self.simulacion.emitir('bebedor', self.id, 'dormir')
+            self.simulacion.cerrado.wait( self.simulacion.frecuencia['bebedor'] )
     
     def tomarCerveza(self, heladera):
-        global monitor
-        cerveza = self.elegirCerveza(heladera)
-        with monitor['bebedores']:
-            while not(cerveza) and localAbierto:
-                logging.info(f'{colors["bebedor"]}BEBEDOR[{self.id}] > No hay {self.cervezasQueToma}s en la heladera[{heladera.id}], esperando repositor...{colors["reset"]}')
-                monitor['bebedores'].wait()
+        hayStock = heladera.hayStock[self.cervezasQueToma]
+        with hayStock:
+            cerveza = self.elegirCerveza(heladera)
+            if not(cerveza) and self.simulacion.localAbierto:
+                inicio = time.monotonic()
+                self.simulacion.trazar('esperando', heladera=heladera.id, tipo=self.cervezasQueToma)
+            while not(cerveza) and self.simulacion.localAbierto:
+                self.simulacion.emitir('bebedor', self.id, 'esperando', heladera=heladera.id, tipo=self.cervezasQueToma)
+                hayStock.wait()
                 cerveza = self.elegirCerveza(heladera)
+                if cerveza or not self.simulacion.localAbierto:
+                    self.espera += time.monotonic() - inicio
+                    self.simulacion.trazar('finEspera', heladera=heladera.id, tipo=self.cervezasQueToma)
+        if not(cerveza):
+            return
         if cerveza.pinchada:
-            logging.info(f'{colors["bebedor"]}BEBEDOR[{self.id}] > Saque una lata pinchada de la heladera[{heladera.id}], Voy a sacar otra...{colors["reset"]}')
+            self.simulacion.emitir('bebedor', self.id, 'pinchada', heladera=heladera.id)
             self.tomarCerveza(heladera)
         else:
             self.cervezasTomadas += 1
-            logging.info(f'{colors["bebedor"]}BEBEDOR[{self.id}] > Me tome una {self.cervezasQueToma}, llevo tomadas {self.cervezasTomadas} cervezas y puedo tomar hasta {self.limite}...{colors["reset"]}')
+            self.simulacion.emitir('bebedor', self.id, 'tomada', tipo=self.cervezasQueToma, cantidad=self.cervezasTomadas)
     
     def elegirCerveza(self, heladera):
         if self.cervezasQueToma == 'cerveza':
-            return heladera.sacar( 'lata' if (randint(0, 10) % 2 == 0) else 'botella')
+            tipo = 'lata' if (randint(0, 10) % 2 == 0) else 'botella'
+            return heladera.sacar(tipo) or heladera.sacar('botella' if tipo == 'lata' else 'lata')
         else:
             return heladera.sacar(self.cervezasQueToma)
 
     def elegirHeladera(self, listaDeHeladeras):
-        return listaDeHeladeras[ randint(0, len(listaDeHeladeras)-1) ]
+        if self.simulacion.eleccion == 'stock':
+            heladera = self.simulacion.indiceDeStock.elegir(self.cervezasQueToma)
+            if heladera:
+                return heladera
+        return listaDeHeladeras[ randint(0, len(listaDeHeladeras)-1) ]      # si ninguna tiene, espera en cualquiera
 
     def presentarse(self):
-        logging.info(f'{colors["bebedor"]}BEBEDOR[{self.id}] > Hola vengo a tomar {self.cervezasQueToma}s!{colors["reset"]}')
-    
-# ------------------------------------------------------------------------------------------------ #
+        self.simulacion.emitir('bebedor', self.id, 'hola', tipo=self.cervezasQueToma, cantidad=self.limite)
+
+class Cliente(Bebedor):
+    # Thread de la pileta de la Puerta: cuando el bebedor que estaba atendiendo llega a su limite y se
+    # va, sigue con el proximo que llego, con su propio id, gusto y limite
+    def __init__(self, simulacion, id=0):
+        super().__init__(simulacion, id=id)
+        self.midiendo = False
+
+    def run(self):
+        puerta = self.simulacion.puerta
+        while True:
+            visita = puerta.visitas.get()
+            if visita is None:
+                break
+            self.id, self.cervezasQueToma, self.limite, llegada = visita
+            puerta.entrar(time.monotonic() - llegada)
+            if self.simulacion.localAbierto:
+                super().run()
+            puerta.salir(self)
+
+    def tomarCerveza(self, heladera):
+        # la espera de cada cerveza, contando la de las latas pinchadas que se vuelven a buscar
+        if self.midiendo:
+            return super().tomarCerveza(heladera)
+        self.midiendo, espera = True, self.espera
+        try:
+            super().tomarCerveza(heladera)
+        finally:
+            self.midiendo = False
+        self.simulacion.puerta.anotarEspera(self.espera - espera)
+
+class Puerta(threading.Thread):
+    # Generador de carga: los bebedores llegan de a uno, con tiempos entre llegadas exponenciales (un
+    # proceso de Poisson cuya tasa sube llegadas['rampa'] por segundo), y los atiende una pileta de
+    # Clientes que se reusan y crece hasta llegadas['pileta'] threads. Cada llegadas['ventana'] segundos
+    # anota las cervezas por segundo y los percentiles de espera, para ver donde se satura el bar.
+    rol = 'puerta'
+
+    def __init__(self, simulacion, llegadas):
+        super().__init__(name='Puerta', daemon=True)
+        self.simulacion = simulacion
+        self.llegadas = dict(llegadas)
+        self.gustos, self.pesos = zip(*self.llegadas['gustos'].items())
+        self.ids = itertools.count(simulacion.cantidad['bebedores'])     # siguen a los de crearBebedores
+        self.visitas = queue.SimpleQueue()
+        self.clientes = []
+        self.lock = threading.Lock()
+        self.llegaron = 0           # bebedores que llegaron
+        self.entraron = 0           # los que ya atiende un Cliente, el resto espera en la puerta
+        self.enElBar = 0            # los que estan tomando ahora
+        self.tomadas = 0            # cervezas de los que ya se fueron
+        self.espera = 0
+        self.esperas = []           # espera de cada cerveza en la ventana actual
+        self.esperasEnLaPuerta = [] # espera para entrar de cada bebedor en la ventana actual
+        self.ventanas = []
+
+    def run(self):
+        inicio = time.monotonic()
+        proximaLlegada = inicio + self.entreLlegadas(0)
+        proximaVentana = inicio + self.llegadas['ventana']
+        llegaron, tomadas = 0, 0        # al cerrar la ventana anterior
+        while self.simulacion.localAbierto:
+            if self.simulacion.cerrado.wait( max(0, min(proximaLlegada, proximaVentana) - time.monotonic()) ):
+                break
+            ahora = time.monotonic()
+            if ahora >= proximaLlegada:
+                self.llegar()
+                proximaLlegada += self.entreLlegadas(ahora - inicio)
+            if ahora >= proximaVentana:
+                llegaron, tomadas = self.cerrarVentana(ahora - inicio, llegaron, tomadas)
+                proximaVentana += self.llegadas['ventana']
+
+    def tasa(self, segundos):
+        return self.llegadas['tasa'] + self.llegadas['rampa'] * segundos
+
+    def entreLlegadas(self, segundos):
+        return expovariate(self.tasa(segundos)) if self.tasa(segundos) > 0 else self.llegadas['ventana']
+
+    def llegar(self):
+        with self.lock:
+            self.llegaron += 1
+            libres = len(self.clientes) - self.enElBar - (self.llegaron - 1 - self.entraron)
+            if libres <= 0 and len(self.clientes) < self.llegadas['pileta']:
+                cliente = Cliente(self.simulacion, len(self.clientes))
+                if self.simulacion.perfil:
+                    self.simulacion.perfil.envolver(cliente)
+                self.clientes.append(cliente)
+                cliente.start()
+        self.visitas.put( (next(self.ids), choices(self.gustos, self.pesos)[0], randint(*self.llegadas['limite']), time.monotonic()) )
+
+    def entrar(self, espera):
+        with self.lock:
+            self.entraron += 1
+            self.enElBar += 1
+            self.esperasEnLaPuerta.append(espera)
+
+    def salir(self, cliente):
+        with self.lock:
+            self.enElBar -= 1
+            self.tomadas += cliente.cervezasTomadas
+            self.espera += cliente.espera
+            cliente.cervezasTomadas, cliente.espera = 0, 0
+
+    def anotarEspera(self, segundos):
+        with self.lock:
+            self.esperas.append(segundos)
+
+    def totalDeTomadas(self):
+        return self.tomadas + sum(map(lambda cliente: cliente.cervezasTomadas, self.clientes))
+
+    def cerrarVentana(self, segundos, llegaronAntes, tomadasAntes):
+        with self.lock:
+            llegaron, tomadas = self.llegaron, self.totalDeTomadas()
+            esperas, self.esperas = sorted(self.esperas), []
+            esperasEnLaPuerta, self.esperasEnLaPuerta = sorted(self.esperasEnLaPuerta), []
+            ventana = {
+                'segundos': segundos,
+                'tasa': self.tasa(segundos),
+                'llegaron': llegaron - llegaronAntes,
+                'enElBar': self.enElBar,
+                'enLaPuerta': self.llegaron - self.entraron,
+                'cervezasPorSegundo': (tomadas - tomadasAntes) / self.llegadas['ventana'],
+                'espera': {f'p{p}': percentil(esperas, p) for p in (50, 90, 99)},
+                'esperaEnLaPuerta': {f'p{p}': percentil(esperasEnLaPuerta, p) for p in (50, 99)}
+            }
+        self.ventanas.append(ventana)
+        logging.info(f'PUERTA > a los {segundos:.0f}s: llegan {ventana["tasa"]:.1f}/s, {ventana["enElBar"]} en el bar, {ventana["enLaPuerta"]} en la puerta, '
+                     f'{ventana["cervezasPorSegundo"]:.1f} cervezas/s, espera p50 {ventana["espera"]["p50"]:.3f}s p90 {ventana["espera"]["p90"]:.3f}s p99 {ventana["espera"]["p99"]:.3f}s')
+        return llegaron, tomadas
+
+    def cerrar(self):
+        with self.lock:
+            for cliente in self.clientes:
+                self.visitas.put(None)
 
-def crearHeladeras():
-    heladeras = []
-    for i in range(cantidad['heladeras']):
-        heladeras.append(Heladera(id=i))
-    return heladeras
+def percentil(valores, p):
+    # de una lista ordenada
+    return valores[min(len(valores) - 1, int(p / 100 * len(valores)))] if valores else 0
 
-def ordenarHeladeras(heladeras):
-    heladeras = sorted(heladeras, key=lambda heladera: heladera.espaciosPara('lata') + heladera.espaciosPara('botella') )
+# ------------------------------------------------------------------------------------------------ #
 
-def crearBebedores():
-    bebedores = []
-    for i in range(cantidad['bebedores']):
-        limite = randint(1, 10)
-        x = randint(1, 30) % 3
-        cervezasQueToma = 'botella' if x==0 else ( 'lata' if x==1 else 'cerveza')
-        bebedores.append( Bebedor(cervezasQueToma, limite, i))
-    return bebedores
+def planDeReparto(packDeCervezas, listaDeHeladeras):
+    # En una sola pasada decide cuantas botellas y latas van a cada heladera, en orden de prioridad.
+    # Lo que no entra en una pasa a la siguiente que tenga lugar para ese envase.
+    quedan = {tipo: packDeCervezas.count(tipo) for tipo in ['botella', 'lata']}
+    plan = []
+    for heladera in listaDeHeladeras:
+        if not any(quedan.values()):
+            break
+        cervezas = {tipo: min(quedan[tipo], heladera.espaciosPara(tipo)) for tipo in quedan}
+        if any(cervezas.values()):
+            plan.append((heladera, cervezas))
+            for tipo in quedan:
+                quedan[tipo] -= cervezas[tipo]
+    return plan
 
 # ------------------------------------------------------------------------------------------------ #
 
-deposito = Deposito()
-heladeras = crearHeladeras()
-proveedor = Proveedor()
-repositor = Repositor()
-bebedores = crearBebedores()
+class Simulacion:
+    # Una noche del bar con su deposito, heladeras, actores, monitores y metricas. Armarla no larga
+    # ningun thread: correr() abre el local, lo cierra a los frecuencia['local'] segundos (o cuando
+    # alguien llama a detener()) y espera a que terminen todos antes de volver.
+    def __init__(self, cantidad=cantidad, frecuencia=frecuencia, registro=registro, eleccion=eleccion, capacidadDeposito=capacidadDeposito, desborde=desborde, umbral=umbral, llegadas=llegadas):
+        self.cantidad = dict(cantidad)
+        self.frecuencia = dict(frecuencia)
+        self.registro = dict(registro)
+        self.eleccion = eleccion
+        self.desborde = desborde
+        self.umbral = dict(umbral)
+        self.localAbierto = False
+        self.detenida = threading.Event()
+        self.cerrado = threading.Event()        # se activa al cerrar el local y corta las esperas entre vueltas de los actores
+        self.metricas = Metricas() if self.registro.get('metricas') else None
+        self.heladerasLlenas = threading.Event()    # los bebedores esperan a que el repositor llene las heladeras por primera vez
+        self.eventos = queue.SimpleQueue()
+        self.heladerasPorReponer = queue.SimpleQueue()     # heladeras que avisaron que hay que reponerlas
+        self.traza = None
+        self.perfil = Perfil(self.registro['perfil']) if self.registro.get('perfil') else None
+        self.deposito = DepositoPorEnvase(self, capacidadDeposito)
+        self.colaDeHeladeras = ColaDeHeladeras()
+        self.indiceDeStock = IndiceDeStock()
+        self.heladeras = self.crearHeladeras()
+        self.proveedores = self.crearProveedores()
+        self.repositores = self.crearRepositores()
+        self.bebedores = self.crearBebedores()
+        self.puerta = Puerta(self, llegadas) if llegadas['tasa'] or llegadas['rampa'] else None
+        self.escritor = Escritor(self)
+
+    def crearHeladeras(self):
+        heladeras = []
+        for i in range(self.cantidad['heladeras']):
+            heladeras.append(Heladera(self, id=i))
+            self.colaDeHeladeras.agregar(heladeras[i])
+            self.indiceDeStock.agregar(heladeras[i])
+        return heladeras
+
+    def crearBebedores(self):
+        bebedores = []
+        for i in range(self.cantidad['bebedores']):
+            limite = randint(1, 10)
+            x = randint(1, 30) % 3
+            cervezasQueToma = 'botella' if x==0 else ( 'lata' if x==1 else 'cerveza')
+            bebedores.append( Bebedor(self, cervezasQueToma, limite, i))
+        return bebedores
+
+    def crearProveedores(self):
+        proveedores = []
+        for i in range(self.cantidad['proveedores']):
+            proveedores.append(Proveedor(self, i))
+        return proveedores
+
+    def crearRepositores(self):
+        repositores = []
+        for i in range(self.cantidad['repositores']):
+            repositores.append(Repositor(self, i))
+        return repositores
+
+    def ordenarHeladeras(self):
+        return self.colaDeHeladeras.ordenadas()
+
+    def repartir(self, packDeCervezas):
+        # Con todas las heladeras trabadas (siempre en orden de id) nadie saca cervezas mientras se decide
+        # el orden y se aplica el plan, asi la prioridad no cambia a mitad del reparto.
+        trabadas = sorted(self.heladeras, key=lambda heladera: heladera.id)
+        for heladera in trabadas:
+            heladera.lock.acquire()
+        try:
+            plan = planDeReparto(packDeCervezas, self.ordenarHeladeras())
+            for heladera, cervezas in plan:
+                heladera.colocar(packDeCervezas, cervezas)
+        finally:
+            for heladera in reversed(trabadas):
+                heladera.lock.release()
+        return plan
+
+    # -------------------------------------------------------------------------------------------- #
+
+    def emitir(self, rol, id, evento, heladera=None, tipo=None, cantidad=None):
+        # los actores solo encolan una tupla, el formato y los colores los pone el Escritor
+        if self.registro['eventos'] and (self.registro['muestreo'] == 1 or random() * self.registro['muestreo'] < 1):
+            self.eventos.put( (time.time(), threading.current_thread().name, rol, id, evento, heladera, tipo, cantidad) )
+
+    def avisarReparto(self, rol, id, plan):
+        for heladera, cervezas in plan:
+            for tipo, cantidad in cervezas.items():
+                if cantidad:
+                    self.emitir(rol, id, 'reparto', heladera=heladera.id, tipo=tipo, cantidad=cantidad)
+
+    def trazar(self, evento, heladera=None, tipo=None, cantidad=1):
+        if self.traza:
+            self.traza.escribir(evento, rolActual(), getattr(threading.current_thread(), 'id', 0), heladera, tipo, cantidad)
 
-localAbierto = True
-logging.info(f'LOCAL ABIERTO !')
+    # -------------------------------------------------------------------------------------------- #
+
+    def correr(self):
+        if self.registro['traza']:
+            self.traza = Traza(self.registro['traza'])
+        self.localAbierto = True
+        logging.info(f'LOCAL ABIERTO !')
+
+        if self.perfil:
+            for actor in self.proveedores + self.repositores + self.bebedores:
+                self.perfil.envolver(actor)
+        self.escritor.start()
+        for proveedor in self.proveedores:
+            proveedor.start()
+        for repositor in self.repositores:
+            repositor.start()
+        for beberor in self.bebedores:
+            beberor.start()
+        if self.puerta:
+            self.puerta.start()
+
+        cierre = time.monotonic() + self.frecuencia['local']
+        while time.monotonic() < cierre:
+            if self.detenida.wait( min(cierre - time.monotonic(), self.frecuencia['metricas'] or self.frecuencia['local']) ):
+                break       # alguien llamo a detener()
+            if self.metricas and self.frecuencia['metricas'] and time.monotonic() < cierre:
+                self.metricas.mostrar()
+
+        self.localAbierto = False
+        self.cerrado.set()
+        logging.info(f'LOCAL CERRADO !')
+
+        # todas las esperas se cortan: las de los monitores con un aviso y las colas con un None
+        self.heladerasLlenas.set()
+        self.deposito.despertar()
+        for repositor in self.repositores:
+            self.heladerasPorReponer.put(None)
+        for heladera in self.heladeras:
+            heladera.despertarBebedores()
+        plazo = time.monotonic() + self.frecuencia['cierre']
+        if self.puerta:
+            self.puerta.join( max(0, plazo - time.monotonic()) )
+            self.puerta.cerrar()
+        for actor in self.proveedores + self.repositores + self.bebedores + (self.puerta.clientes if self.puerta else []):
+            actor.join( max(0, plazo - time.monotonic()) )
+            if actor.is_alive():
+                logging.warning(f'{actor.name} ({actor.rol}) no termino antes del plazo de cierre')
+        logging.info(f'Cerrado en {self.frecuencia["cierre"] - (plazo - time.monotonic()):.3f} segundos')
+        if self.metricas:
+            self.metricas.mostrar()
+        if self.perfil:
+            self.perfil.mostrar()
+            self.perfil.guardar()
+
+        self.eventos.put(None)      # lo que quedo en la cola se muestra antes de terminar
+        self.escritor.join()
+        if self.traza:
+            self.traza.cerrar()
+        return self
+
+    def detener(self):
+        self.detenida.set()
+
+    def resultado(self):
+        tomadas = sum(map(lambda bebedor: bebedor.cervezasTomadas, self.bebedores)) + (self.puerta.totalDeTomadas() if self.puerta else 0)
+        espera = sum(map(lambda bebedor: bebedor.espera, self.bebedores)) + (self.puerta.espera if self.puerta else 0)
+        return {
+            'entregadas': sum(map(lambda proveedor: proveedor.entregadas, self.proveedores)),
+            'tiradas': sum(map(lambda proveedor: proveedor.tiradas, self.proveedores)),
+            'tomadas': tomadas,
+            'espera': espera,
+            'esperaPorCerveza': espera / tomadas if tomadas else 0,
+            'pinchadas': sum(map(lambda repositor: repositor.pinchadasSacadas, self.repositores)),
+            'llegaron': self.puerta.llegaron if self.puerta else 0,
+            'ventanas': self.puerta.ventanas if self.puerta else []
+        }
+
+# ------------------------------------------------------------------------------------------------ #
 
-proveedor.start()
-repositor.start()
-for beberor in bebedores:
-    beberor.start()
-time.sleep( frecuencia['local'])
+if __name__ == '__main__':
+    from colorama import init, Fore
 
-localAbierto = False
-logging.info(f'LOCAL CERRADO !')
+    init(convert=(os.name == 'nt'))
+    logging.basicConfig(format='%(asctime)s.%(msecs)03d [%(threadName)s] - %(message)s', datefmt='%H:%M:%S', level=logging.INFO)
+    colors.update({
+        'repositor': Fore.GREEN,    # color de Repositor
+        'proveedor': Fore.YELLOW,   # color de Provedor
+        'bebedor': Fore.MAGENTA,    # color de Bebedores
+        'reset': Fore.WHITE         # vuelve a poner el color en blanco
+    })
 
-for key in monitor.keys():
-    with  monitor[key]:
-        monitor[key].notify()
+    Simulacion(cantidad, frecuencia).correr()
@@ -0,0 +1,390 @@
+import os
+import sys
+import heapq
+import logging
+import itertools
+from random import Random
+from collections import deque
+from bonus3 import Cerveza, PackDeCervezas, Deposito, HeladeraBase, planDeReparto
+
+# ------------------------------------------------------------------------------------------------ #
+# Misma fiesta que bonus3.py pero simulada con un reloj virtual: en vez de threads y time.sleep cada
+# actor es un generador que devuelve cuanto quiere dormir (segundos virtuales) o la condicion en la
+# que se queda esperando, y una cola de eventos los va despertando en orden. Una noche entera se
+# simula en milisegundos y con la misma semilla siempre da el mismo resultado. Las cervezas, el deposito
+# y lo comun de las heladeras se importan de bonus3.py; aca solo esta lo propio del reloj virtual.
+# ------------------------------------------------------------------------------------------------ #
+
+colors = {
+    'repositor': '',    # se completan con colorama solo al correr desde la terminal
+    'proveedor': '',
+    'bebedor': '',
+    'reset': ''
+}
+cantidad = {
+    'heladeras': 3,
+    'bebedores': 5,
+    'repositores': 1
+}
+frecuencia = {
+    'repositor': 2, # frecuencia de control de heladeras [Segundos virtuales]
+    'proveedor': 3, # frecuencia de entrega de paquetes de cerveza [Segundos virtuales]
+    'bebedor': 2,   # frecuencia de consumo de cerveza de los clientes [Segundos virtuales]
+    'local': 60     # Tiempo que el local esta abierto [Segundos virtuales]
+}
+
+# ------------------------------------------------------------------------------------------------ #
+
+class CondicionVirtual:
+    def __init__(self, reloj):
+        self.reloj = reloj
+        self.esperando = deque()
+
+    def notify(self, cantidad=1):
+        for x in range( min(cantidad, len(self.esperando)) ):
+            self.reloj.programar( self.esperando.popleft() )
+
+    def notify_all(self):
+        self.notify( len(self.esperando) )
+
+class EventoVirtual(CondicionVirtual):
+    def __init__(self, reloj):
+        super().__init__(reloj)
+        self.activo = False
+
+    def set(self):
+        self.activo = True
+        self.notify_all()
+
+class RelojVirtual:
+    def __init__(self):
+        self.ahora = 0
+        self.eventos = []                       # heap de (tiempo, orden de llegada, actor)
+        self.secuencia = itertools.count()      # desempata los eventos simultaneos en orden de llegada
+        self.actual = None                      # actor que esta corriendo, para el log
+
+    def iniciar(self, actor):
+        actor.pasos = actor.run()
+        self.programar(actor)
+
+    def programar(self, actor, demora=0):
+        heapq.heappush(self.eventos, (self.ahora + demora, next(self.secuencia), actor))
+
+    def correr(self, hasta):
+        while self.eventos and self.eventos[0][0] <= hasta:
+            self.ahora, orden, self.actual = heapq.heappop(self.eventos)
+            try:
+                espera = next(self.actual.pasos)
+            except StopIteration:
+                continue
+            if isinstance(espera, CondicionVirtual):
+                espera.esperando.append(self.actual)
+            else:
+                self.programar(self.actual, espera)
+        self.ahora = hasta
+
+# ------------------------------------------------------------------------------------------------ #
+
+class Heladera(HeladeraBase):
+    def __init__(self, reloj, capacidadLatas=15, capacidadBotellas=10, id=0):
+        super().__init__(None, capacidadLatas, capacidadBotellas, id)
+        self.reservada = False      # True mientras algun repositor la esta llenando
+        self.reloj = reloj
+        self.vaciaDesde = reloj.ahora   # instante desde el que esta vacia, None si tiene cervezas
+        self.segundosVacia = 0
+        self.hayStock = {gusto: CondicionVirtual(reloj) for gusto in ['lata', 'botella', 'cerveza']}  # una condicion por gusto de bebedor
+
+    def colocar(self, packDeCervezas, cantidades=None):
+        for tipo in self.capacidad:     # saca del pack todo lo que entra (o lo que diga cantidades), el resto queda en el pack
+            cervezas = packDeCervezas.removeMany(tipo, self.espaciosPara(tipo) if cantidades is None else cantidades[tipo])
+            self.cervezas.extend( cervezas )
+            self.avisarStock(tipo, len(cervezas))
+        self.registrarStock()
+
+    def sacar(self, unTipoDeCerveza, cantidad=None):
+        cervezas = super().sacar(unTipoDeCerveza, cantidad)
+        self.registrarStock()
+        return cervezas
+
+    def registrarStock(self):
+        vacia = self.cervezas.size() == 0
+        if vacia and self.vaciaDesde is None:
+            self.vaciaDesde = self.reloj.ahora
+        elif not vacia and self.vaciaDesde is not None:
+            self.segundosVacia += self.reloj.ahora - self.vaciaDesde
+            self.vaciaDesde = None
+
+    def tiempoVacia(self):
+        return self.segundosVacia + (self.reloj.ahora - self.vaciaDesde if self.vaciaDesde is not None else 0)
+
+    def avisarStock(self, unTipoDeCerveza, cantidad):
+        self.hayStock[unTipoDeCerveza].notify(cantidad)
+        self.hayStock['cerveza'].notify(cantidad)
+
+    def despertarBebedores(self):
+        for hayStock in self.hayStock.values():
+            hayStock.notify_all()
+
+    def quitarPinchadas(self):
+        sacadas = self.cervezas.removeAll( Cerveza('lata', True) )
+        self.registrarStock()
+        return sacadas
+
+# ------------------------------------------------------------------------------------------------ #
+
+class Proveedor:
+    def __init__(self, simulacion):
+        self.simulacion = simulacion
+        self.nombre = 'Proveedor'
+        self.packDeCervezas = PackDeCervezas()
+        self.entregadas = 0
+
+    def run(self):
+        while self.simulacion.localAbierto:
+            self.producirCervezas()
+            self.entregar()
+            yield self.simulacion.frecuencia['proveedor']
+
+    def entregar(self):
+        entregadas = self.packDeCervezas.size()
+        plan = self.simulacion.repartir(self.packDeCervezas) if self.simulacion.heladerasLlenas.activo else []    # el primer llenado va en orden
+        self.simulacion.deposito.colocar(self.packDeCervezas)       # lo que no entro en ninguna heladera
+        self.simulacion.monitor['repositor'].notify_all()
+        self.entregadas += entregadas
+        self.simulacion.log(f'{colors["proveedor"]}PROVEEDOR > Entregue un paquete de {entregadas} cervezas{colors["reset"]}')
+        for heladera, cervezas in plan:
+            self.simulacion.log(f'{colors["proveedor"]}PROVEEDOR > {cervezas["botella"]} botellas y {cervezas["lata"]} latas en Heladera[{heladera.id}]{colors["reset"]}')
+        self.packDeCervezas.clear()
+
+    def producirCervezas(self):
+        randint = self.simulacion.random.randint
+        for x in range( randint(1, 30) ):
+            tipo = ('lata' if (randint(0, 10) % 2 == 0) else 'botella')
+            pinchada = (False if ( tipo=='botella' or randint(0, 25) % 5 != 0) else True)
+            self.packDeCervezas.append( Cerveza(tipo, pinchada) )
+
+# ------------------------------------------------------------------------------------------------ #
+
+class Repositor:
+    def __init__(self, simulacion, id=0):
+        self.simulacion = simulacion
+        self.nombre = f'Repositor-{id}'
+        self.id = id
+        self.cervezas = PackDeCervezas()
+        self.pinchadasSacadas = 0
+
+    def run(self):
+        heladeras = self.simulacion.heladeras
+        for heladera in heladeras:
+            if not heladera.reservada:      # si la esta llenando otro repositor pasamos a la siguiente
+                heladera.enchufada = True
+                yield from self.llenarReservada(heladera)
+                heladera.enfriadoRapido = True
+                if all(map(lambda unaHeladera: unaHeladera.enfriadoRapido, heladeras)):
+                    self.simulacion.heladerasLlenas.set()
+        yield from self.controlarHeladeras()
+
+    def controlarHeladeras(self):
+        while self.simulacion.localAbierto:
+            self.quitarPinchadas()
+            self.repartirDeposito()
+            yield self.simulacion.frecuencia['repositor']
+
+    def repartirDeposito(self):
+        # lo que quedo en el deposito se reparte de una sola vez, sin esperar a completar la primera heladera
+        for heladera, cervezas in self.simulacion.repartir(self.simulacion.deposito.cervezas):
+            self.simulacion.log(f'{colors["repositor"]}REPOSITOR[{self.id}] > {cervezas["botella"]} botellas y {cervezas["lata"]} latas en Heladera[{heladera.id}]{colors["reset"]}')
+
+    def traerCervezas(self, unTipoDeCerveza, cantidad):
+        deposito = self.simulacion.deposito
+        cervezasDelDeposito, faltantes = deposito.sacar(unTipoDeCerveza, cantidad)
+        self.cervezas.extend(cervezasDelDeposito.get())
+        while faltantes and self.simulacion.localAbierto:
+            self.simulacion.log(f'{colors["repositor"]}REPOSITOR[{self.id}] > Sin stock de {unTipoDeCerveza}s para reponer, esperando proveedor...{colors["reset"]}')
+            yield self.simulacion.monitor['repositor']
+            cervezasDelDeposito, faltantes = deposito.sacar(unTipoDeCerveza, faltantes)
+            self.cervezas.extend(cervezasDelDeposito.get())
+
+    def reponer(self, unTipoDeCerveza, unaHeladera):
+        while unaHeladera.hayEspacioPara(unTipoDeCerveza) and self.simulacion.localAbierto:
+            if not self.cervezas.contains(unTipoDeCerveza):
+                yield from self.traerCervezas( unTipoDeCerveza, unaHeladera.espaciosPara(unTipoDeCerveza) )
+            unaHeladera.colocar( self.cervezas )
+
+    def llenar(self, heladera):
+        yield from self.reponer('botella', heladera)
+        yield from self.reponer('lata', heladera)
+        self.simulacion.log(f'{colors["repositor"]}REPOSITOR[{self.id}] > Heladera[{heladera.id}] llena{colors["reset"]}')
+
+    def llenarReservada(self, heladera):
+        heladera.reservada = True
+        yield from self.llenar(heladera)
+        heladera.reservada = False
+
+    def quitarPinchadas(self):
+        for heladera in self.simulacion.heladeras:
+            sacadas = heladera.quitarPinchadas()
+            self.pinchadasSacadas += sacadas
+            if sacadas != 0:
+                self.simulacion.log(f'{colors["repositor"]}REPOSITOR[{self.id}] > {sacadas} latas pinchadas sacadas de Heladera[{heladera.id}]{colors["reset"]}')
+
+# ------------------------------------------------------------------------------------------------ #
+
+class Bebedor:
+    def __init__(self, simulacion, cervezasQueToma='cerveza', limite=0, id=0):
+        self.simulacion = simulacion
+        self.nombre = f'Bebedor-{id}'
+        self.id = id
+        self.limite = limite
+        self.cervezasTomadas = 0
+        self.cervezasQueToma = cervezasQueToma
+        self.espera = 0             # segundos virtuales esperando que el repositor llene la heladera
+
+    def run(self):
+        if not self.simulacion.heladerasLlenas.activo:
+            yield self.simulacion.heladerasLlenas
+        self.presentarse()
+        while self.cervezasTomadas < self.limite and self.simulacion.localAbierto:
+            yield from self.tomarCerveza( self.elegirHeladera( self.simulacion.heladeras ) )
+            if self.cervezasTomadas == self.limite:
+                self.simulacion.log(f'{colors["bebedor"]}BEBEDOR[{self.id}] > No puedo tomar más, me voy a dormir...{colors["reset"]}')
+            yield self.simulacion.frecuencia['bebedor']
+
+    def tomarCerveza(self, heladera):
+        hayStock = heladera.hayStock[self.cervezasQueToma]
+        inicio = self.simulacion.reloj.ahora
+        cerveza = self.elegirCerveza(heladera)
+        while not(cerveza) and self.simulacion.localAbierto:
+            self.simulacion.log(f'{colors["bebedor"]}BEBEDOR[{self.id}] > No hay {self.cervezasQueToma}s en la heladera[{heladera.id}], esperando repositor...{colors["reset"]}')
+            yield hayStock
+            cerveza = self.elegirCerveza(heladera)
+        self.espera += self.simulacion.reloj.ahora - inicio
+        if not(cerveza):
+            return
+        if cerveza.pinchada:
+            self.simulacion.log(f'{colors["bebedor"]}BEBEDOR[{self.id}] > Saque una lata pinchada de la heladera[{heladera.id}], Voy a sacar otra...{colors["reset"]}')
+            yield from self.tomarCerveza(heladera)
+        else:
+            self.cervezasTomadas += 1
+            self.simulacion.log(f'{colors["bebedor"]}BEBEDOR[{self.id}] > Me tome una {self.cervezasQueToma}, llevo tomadas {self.cervezasTomadas} cervezas y puedo tomar hasta {self.limite}...{colors["reset"]}')
+
+    def elegirCerveza(self, heladera):
+        if self.cervezasQueToma == 'cerveza':
+            tipo = 'lata' if (self.simulacion.random.randint(0, 10) % 2 == 0) else 'botella'
+            return heladera.sacar(tipo) or heladera.sacar('botella' if tipo == 'lata' else 'lata')
+        else:
+            return heladera.sacar(self.cervezasQueToma)
+
+    def elegirHeladera(self, listaDeHeladeras):
+        return listaDeHeladeras[ self.simulacion.random.randint(0, len(listaDeHeladeras)-1) ]
+
+    def presentarse(self):
+        self.simulacion.log(f'{colors["bebedor"]}BEBEDOR[{self.id}] > Hola vengo a tomar {self.cervezasQueToma}s!{colors["reset"]}')
+
+# ------------------------------------------------------------------------------------------------ #
+
+class SimulacionDiscreta:
+    def __init__(self, cantidad=cantidad, frecuencia=frecuencia, semilla=None):
+        self.cantidad = dict(cantidad)
+        self.frecuencia = dict(frecuencia)
+        self.random = Random(semilla)
+        self.reloj = RelojVirtual()
+        self.localAbierto = False
+        self.monitor = {
+            'repositor': CondicionVirtual(self.reloj)
+        }
+        self.heladerasLlenas = EventoVirtual(self.reloj)
+        self.deposito = Deposito()
+        self.heladeras = self.crearHeladeras()
+        self.proveedor = Proveedor(self)
+        self.repositores = self.crearRepositores()
+        self.bebedores = self.crearBebedores()
+
+    def crearHeladeras(self):
+        heladeras = []
+        for i in range(self.cantidad['heladeras']):
+            heladeras.append(Heladera(self.reloj, id=i))
+        return heladeras
+
+    def ordenarHeladeras(self):
+        # mismo orden que ColaDeHeladeras en bonus3.py: primero las que tienen menos cervezas
+        return sorted(self.heladeras, key=lambda heladera: (heladera.cervezas.size(), heladera.id))
+
+    def repartir(self, packDeCervezas):
+        # con un solo actor a la vez nadie puede sacar cervezas entre el plan y su aplicacion
+        plan = planDeReparto(packDeCervezas, self.ordenarHeladeras())
+        for heladera, cervezas in plan:
+            heladera.colocar(packDeCervezas, cervezas)
+        return plan
+
+    def crearBebedores(self):
+        bebedores = []
+        for i in range(self.cantidad['bebedores']):
+            limite = self.random.randint(1, 10)
+            x = self.random.randint(1, 30) % 3
+            cervezasQueToma = 'botella' if x==0 else ( 'lata' if x==1 else 'cerveza')
+            bebedores.append( Bebedor(self, cervezasQueToma, limite, i))
+        return bebedores
+
+    def crearRepositores(self):
+        repositores = []
+        for i in range(self.cantidad['repositores']):
+            repositores.append( Repositor(self, i))
+        return repositores
+
+    def log(self, mensaje):
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            nombre = self.reloj.actual.nombre if self.reloj.actual else 'MainThread'
+            logging.info(f'{self.reloj.ahora:9.3f} [{nombre}] - {mensaje}')
+
+    def correr(self):
+        self.localAbierto = True
+        self.log(f'LOCAL ABIERTO !')
+
+        self.reloj.iniciar(self.proveedor)
+        for repositor in self.repositores:
+            self.reloj.iniciar(repositor)
+        for bebedor in self.bebedores:
+            self.reloj.iniciar(bebedor)
+        self.reloj.correr( self.frecuencia['local'] )
+
+        self.localAbierto = False
+        self.reloj.actual = None
+        self.log(f'LOCAL CERRADO !')
+
+        self.heladerasLlenas.set()
+        for key in self.monitor.keys():
+            self.monitor[key].notify_all()
+        for heladera in self.heladeras:
+            heladera.despertarBebedores()
+        self.reloj.correr( self.reloj.ahora )    # los que estaban esperando terminan en el mismo instante
+        return self
+
+    def resultado(self):
+        tomadas = sum(map(lambda bebedor: bebedor.cervezasTomadas, self.bebedores))
+        espera = sum(map(lambda bebedor: bebedor.espera, self.bebedores))
+        return {
+            'entregadas': self.proveedor.entregadas,
+            'tomadas': tomadas,
+            'espera': espera,                                       # segundos esperando, sumando todos los bebedores
+            'esperaPorCerveza': espera / tomadas if tomadas else 0,
+            'heladeraVacia': sum(map(lambda heladera: heladera.tiempoVacia(), self.heladeras)),
+            'pinchadas': sum(map(lambda repositor: repositor.pinchadasSacadas, self.repositores))
+        }
+
+# ------------------------------------------------------------------------------------------------ #
+
+if __name__ == '__main__':
+    from colorama import init, Fore
+
+    init(convert=os.name == 'nt')
+    logging.basicConfig(format='%(message)s', level=logging.INFO)
+    colors.update({
+        'repositor': Fore.GREEN,    # color de Repositor
+        'proveedor': Fore.YELLOW,   # color de Provedor
+        'bebedor': Fore.MAGENTA,    # color de Bebedores
+        'reset': Fore.WHITE         # vuelve a poner el color en blanco
+    })
+
+    semilla = int(sys.argv[1]) if len(sys.argv) > 1 else None     # python discreto.py [semilla]
+    SimulacionDiscreta(cantidad, frecuencia, semilla).correr()
@@ -0,0 +1,377 @@
+import os
+import time
+import logging
+import argparse
+import threading
+import multiprocessing
+from random import randint, random
+from multiprocessing import shared_memory
+from bonus3 import Cerveza
+
+# ------------------------------------------------------------------------------------------------ #
+# Misma fiesta que bonus3.py pero repartida en varios procesos, para que las busquedas de stock y el
+# registro de muchos bebedores no compitan por un solo GIL: el proveedor, el repositor y cada grupo de
+# bebedores corren en su propio proceso y comparten un solo bar. El stock de cada heladera y del
+# deposito son contadores en multiprocessing.shared_memory, cuidados por locks y conditions que
+# sirven entre procesos, con la misma interfaz que Heladera y Deposito en bonus3.py.
+#
+# Diferencias con la version con threads, que no cambian los promedios pero si el detalle:
+#   - las cervezas son contadores por tipo de envase, asi que las latas pinchadas de una heladera
+#     salen al azar y no en orden de llegada
+#   - el deposito no tiene limite y el proveedor reparte en las heladeras de a una, sin trabarlas todas
+#   - los bebedores de una heladera esperan en un solo monitor, no en uno por gusto
+# ------------------------------------------------------------------------------------------------ #
+
+cantidad = {
+    'heladeras': 3,
+    'bebedores': 5,
+    'proveedores': 1,
+    'procesos': os.cpu_count() or 1     # procesos entre los que se reparten los bebedores
+}
+frecuencia = {
+    'proveedor': 3, # frecuencia de entrega de paquetes de cerveza [Segundos]
+    'bebedor': 2,   # frecuencia de consumo de cerveza de los clientes [Segundos]
+    'cierre': 1,    # plazo para que terminen los procesos despues de cerrar el local [Segundos]
+    'local': 60     # Tiempo que el local esta abierto [Segundos]
+}
+capacidad = {'lata': 15, 'botella': 10}
+umbral = {'lata': 5, 'botella': 3}     # por debajo de este stock la heladera le avisa al repositor que la reponga
+
+LATA, BOTELLA, PINCHADAS, POR_REPONER = 0, 1, 2, 3      # contadores de cada heladera (el deposito usa los tres primeros)
+TIPOS = {'lata': LATA, 'botella': BOTELLA}
+TOTALES = ['entregadas', 'tomadas', 'pinchadas', 'espera']     # la espera en microsegundos
+
+# ------------------------------------------------------------------------------------------------ #
+
+class Bar:
+    # Todo lo que comparten los procesos. Se pasa entero a cada proceso al crearlo: los locks y los
+    # eventos se heredan y la memoria compartida se vuelve a abrir por nombre si hace falta.
+    def __init__(self, cantidad=cantidad, frecuencia=frecuencia, capacidad=capacidad, umbral=umbral):
+        heladeras = cantidad['heladeras']
+        self.cantidad = dict(cantidad)
+        self.frecuencia = dict(frecuencia)
+        self.capacidad = dict(capacidad)
+        self.umbral = dict(umbral)
+        self.memoria = shared_memory.SharedMemory(create=True, size=8 * (4 * heladeras + 3 + len(TOTALES)))
+        self.memoria.buf[:] = bytes(self.memoria.size)
+        self.locks = [multiprocessing.RLock() for i in range(heladeras)]
+        self.hayStock = [multiprocessing.Condition(lock) for lock in self.locks]
+        self.depositoLock = {tipo: multiprocessing.RLock() for tipo in TIPOS}
+        self.depositoHayStock = {tipo: multiprocessing.Condition(self.depositoLock[tipo]) for tipo in TIPOS}
+        self.totalesLock = multiprocessing.Lock()
+        self.heladerasLlenas = multiprocessing.Event()
+        self.cerrado = multiprocessing.Event()
+        self.porReponer = multiprocessing.Queue()      # ids de las heladeras que avisaron que hay que reponerlas
+        self.abrirVistas()
+
+    def abrirVistas(self):
+        contadores = self.memoria.buf.cast('q')
+        heladeras = self.cantidad['heladeras']
+        self.heladeras = [contadores[4 * i:4 * i + 4] for i in range(heladeras)]
+        self.deposito = contadores[4 * heladeras:4 * heladeras + 3]
+        self.totales = contadores[4 * heladeras + 3:]
+        self.vistas = self.heladeras + [self.deposito, self.totales, contadores]
+
+    def cerrarVistas(self):
+        # la memoria compartida no se puede cerrar mientras quede alguna vista abierta
+        for vista in self.vistas:
+            vista.release()
+        self.memoria.close()
+
+    def __getstate__(self):
+        estado = dict(self.__dict__)
+        for vista in ['heladeras', 'deposito', 'totales', 'vistas']:
+            del estado[vista]
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self.abrirVistas()
+
+    def sumar(self, totales):
+        with self.totalesLock:
+            for i, total in enumerate(TOTALES):
+                self.totales[i] += totales[total]
+
+    def resultado(self):
+        with self.totalesLock:
+            totales = dict(zip(TOTALES, self.totales.tolist()))
+        totales['espera'] /= 1e6
+        totales['esperaPorCerveza'] = totales['espera'] / totales['tomadas'] if totales['tomadas'] else 0
+        return totales
+
+# ------------------------------------------------------------------------------------------------ #
+
+def mover(origen, destino, tipo, cantidad):
+    # pasa hasta cantidad cervezas de un tipo de un contador a otro; las latas pinchadas que van con
+    # ellas salen al azar entre las latas del origen
+    cantidad = min(cantidad, origen[tipo])
+    if tipo == LATA:
+        pinchadas = 0
+        for x in range(cantidad):
+            if random() * (origen[LATA] - x) < origen[PINCHADAS] - pinchadas:
+                pinchadas += 1
+        origen[PINCHADAS] -= pinchadas
+        destino[PINCHADAS] += pinchadas
+    origen[tipo] -= cantidad
+    destino[tipo] += cantidad
+    return cantidad
+
+class Deposito:
+    def __init__(self, bar):
+        self.bar = bar
+        self.hayStock = bar.depositoHayStock
+
+    def colocar(self, packDeCervezas):
+        for tipo, indice in TIPOS.items():
+            if packDeCervezas[indice]:
+                with self.hayStock[tipo]:
+                    mover(packDeCervezas, self.bar.deposito, indice, packDeCervezas[indice])
+                    self.hayStock[tipo].notify_all()
+
+    def sacar(self, unTipoDeCerveza, cantidad):
+        cervezas = [0, 0, 0]
+        with self.bar.depositoLock[unTipoDeCerveza]:
+            sacadas = mover(self.bar.deposito, cervezas, TIPOS[unTipoDeCerveza], cantidad)
+        return cervezas, cantidad - sacadas     # lo que se pudo sacar y lo que falto
+
+class Heladera:
+    def __init__(self, bar, id):
+        self.bar = bar
+        self.id = id
+        self.capacidad = bar.capacidad
+        self.stock = bar.heladeras[id]
+        self.lock = bar.locks[id]
+        self.hayStock = bar.hayStock[id]
+
+    def colocar(self, packDeCervezas):
+        with self.lock:     # saca del pack todo lo que entra, el resto queda en el pack
+            colocadas = sum(mover(packDeCervezas, self.stock, indice, self.espaciosPara(tipo)) for tipo, indice in TIPOS.items())
+            if colocadas:
+                self.hayStock.notify_all()
+            if self.stock[PINCHADAS]:
+                self.avisarRepositor()      # para que saque las pinchadas
+            return colocadas
+
+    def sacar(self, unTipoDeCerveza):
+        with self.lock:
+            cervezas = [0, 0, 0]
+            if not mover(self.stock, cervezas, TIPOS[unTipoDeCerveza], 1):
+                return False
+            if self.stock[TIPOS[unTipoDeCerveza]] < self.bar.umbral[unTipoDeCerveza]:
+                self.avisarRepositor()
+            return Cerveza(unTipoDeCerveza, cervezas[PINCHADAS] > 0)
+
+    def avisarRepositor(self):
+        with self.lock:
+            if not self.stock[POR_REPONER]:
+                self.stock[POR_REPONER] = 1
+                self.bar.porReponer.put(self.id)
+
+    def quitarPinchadas(self):
+        with self.lock:
+            sacadas = self.stock[PINCHADAS]
+            self.stock[LATA] -= sacadas
+            self.stock[PINCHADAS] = 0
+            return sacadas
+
+    def cervezas(self):
+        return self.stock[LATA] + self.stock[BOTELLA]
+
+    def hayEspacioPara(self, unTipoDeCerveza):
+        return self.espaciosPara(unTipoDeCerveza) > 0
+
+    def espaciosPara(self, unTipoDeCerveza):
+        return self.capacidad[unTipoDeCerveza] - self.stock[TIPOS[unTipoDeCerveza]]
+
+    def estaLlena(self):
+        return not self.hayEspacioPara('lata') and not self.hayEspacioPara('botella')
+
+# ------------------------------------------------------------------------------------------------ #
+
+def proveedor(bar, id):
+    heladeras, deposito = [Heladera(bar, i) for i in range(bar.cantidad['heladeras'])], Deposito(bar)
+    totales = dict.fromkeys(TOTALES, 0)
+    while not bar.cerrado.is_set():
+        packDeCervezas = producirCervezas()
+        entregadas = packDeCervezas[LATA] + packDeCervezas[BOTELLA]
+        totales['entregadas'] += entregadas
+        if bar.heladerasLlenas.is_set():        # el primer llenado lo hace el repositor en orden
+            for heladera in sorted(heladeras, key=lambda heladera: (heladera.cervezas(), heladera.id)):
+                heladera.colocar(packDeCervezas)
+        logging.info(f'PROVEEDOR[{id}] > Entregue un paquete de {entregadas} cervezas')
+        deposito.colocar(packDeCervezas)       # lo que no entro en ninguna heladera
+        for heladera in heladeras:
+            if any(heladera.stock[indice] < bar.umbral[tipo] for tipo, indice in TIPOS.items()):
+                heladera.avisarRepositor()      # las que no se pudieron completar antes por falta de stock
+        bar.cerrado.wait(bar.frecuencia['proveedor'])
+    bar.sumar(totales)
+    bar.cerrarVistas()
+
+def producirCervezas():
+    packDeCervezas = [0, 0, 0]
+    for x in range( randint(1, 30) ):
+        tipo = ('lata' if (randint(0, 10) % 2 == 0) else 'botella')
+        packDeCervezas[TIPOS[tipo]] += 1
+        if tipo == 'lata' and randint(0, 25) % 5 == 0:
+            packDeCervezas[PINCHADAS] += 1
+    return packDeCervezas
+
+def repositor(bar):
+    heladeras, deposito = [Heladera(bar, i) for i in range(bar.cantidad['heladeras'])], Deposito(bar)
+    totales = dict.fromkeys(TOTALES, 0)
+    for heladera in heladeras:
+        for tipo in ['botella', 'lata']:
+            with deposito.hayStock[tipo]:
+                while heladera.hayEspacioPara(tipo) and not bar.cerrado.is_set():
+                    cervezas, faltantes = deposito.sacar(tipo, heladera.espaciosPara(tipo))
+                    heladera.colocar(cervezas)
+                    if faltantes:
+                        logging.info(f'REPOSITOR > Sin stock de {tipo}s para reponer, esperando proveedor...')
+                        deposito.hayStock[tipo].wait()
+        logging.info(f'REPOSITOR > Heladera[{heladera.id}] llena')
+    bar.heladerasLlenas.set()
+
+    while not bar.cerrado.is_set():
+        id = bar.porReponer.get()
+        if id is None:
+            break       # cerro el local
+        heladera = heladeras[id]
+        with heladera.lock:
+            heladera.stock[POR_REPONER] = 0     # lo que se saque de aca en adelante la vuelve a anotar
+        sacadas = heladera.quitarPinchadas()
+        totales['pinchadas'] += sacadas
+        if sacadas:
+            logging.info(f'REPOSITOR > {sacadas} latas pinchadas sacadas de Heladera[{id}]')
+        for tipo in ['botella', 'lata']:
+            cervezas, faltantes = deposito.sacar(tipo, heladera.espaciosPara(tipo))
+            heladera.colocar(cervezas)
+            deposito.colocar(cervezas)      # si otro la lleno mientras tanto, lo que sobro vuelve al deposito
+    bar.sumar(totales)
+    bar.cerrarVistas()
+
+# ------------------------------------------------------------------------------------------------ #
+
+class Bebedor(threading.Thread):
+    def __init__(self, bar, heladeras, cervezasQueToma='cerveza', limite=0, id=0):
+        super().__init__(daemon=True)
+        self.bar = bar
+        self.heladeras = heladeras
+        self.id = id
+        self.limite = limite
+        self.cervezasTomadas = 0
+        self.cervezasQueToma = cervezasQueToma
+        self.espera = 0
+
+    def run(self):
+        self.bar.heladerasLlenas.wait()
+        logging.info(f'BEBEDOR[{self.id}] > Hola vengo a tomar {self.cervezasQueToma}s, puedo tomar hasta {self.limite}!')
+        while self.cervezasTomadas < self.limite and not self.bar.cerrado.is_set():
+            self.tomarCerveza( self.elegirHeladera() )
+            if self.cervezasTomadas == self.limite:
+                logging.info(f'BEBEDOR[{self.id}] > No puedo tomar más, me voy a dormir...')
+            self.bar.cerrado.wait(self.bar.frecuencia['bebedor'])
+
+    def tomarCerveza(self, heladera):
+        with heladera.hayStock:
+            cerveza = self.elegirCerveza(heladera)
+            if not(cerveza) and not self.bar.cerrado.is_set():
+                inicio = time.monotonic()
+                logging.info(f'BEBEDOR[{self.id}] > No hay {self.cervezasQueToma}s en la heladera[{heladera.id}], esperando repositor...')
+                while not(cerveza) and not self.bar.cerrado.is_set():
+                    heladera.hayStock.wait()
+                    cerveza = self.elegirCerveza(heladera)
+                self.espera += time.monotonic() - inicio
+        if not(cerveza):
+            return
+        if cerveza.pinchada:
+            logging.info(f'BEBEDOR[{self.id}] > Saque una lata pinchada de la heladera[{heladera.id}], Voy a sacar otra...')
+            self.tomarCerveza(heladera)
+        else:
+            self.cervezasTomadas += 1
+            logging.info(f'BEBEDOR[{self.id}] > Me tome una {self.cervezasQueToma}, llevo tomadas {self.cervezasTomadas} cervezas...')
+
+    def elegirCerveza(self, heladera):
+        if self.cervezasQueToma == 'cerveza':
+            tipo = 'lata' if (randint(0, 10) % 2 == 0) else 'botella'
+            return heladera.sacar(tipo) or heladera.sacar('botella' if tipo == 'lata' else 'lata')
+        else:
+            return heladera.sacar(self.cervezasQueToma)
+
+    def elegirHeladera(self):
+        # una al azar entre las que tienen lo que toma, mirando los contadores sin trabar nada
+        tipos = [TIPOS[self.cervezasQueToma]] if self.cervezasQueToma in TIPOS else [LATA, BOTELLA]
+        conStock = [heladera for heladera in self.heladeras if any(heladera.stock[tipo] for tipo in tipos)]
+        heladeras = conStock or self.heladeras      # si ninguna tiene, espera en cualquiera
+        return heladeras[ randint(0, len(heladeras)-1) ]
+
+def grupoDeBebedores(bar, ids):
+    heladeras = [Heladera(bar, i) for i in range(bar.cantidad['heladeras'])]
+    bebedores = []
+    for id in ids:
+        x = randint(1, 30) % 3
+        cervezasQueToma = 'botella' if x==0 else ( 'lata' if x==1 else 'cerveza')
+        bebedores.append( Bebedor(bar, heladeras, cervezasQueToma, randint(1, 10), id) )
+    for bebedor in bebedores:
+        bebedor.start()
+    for bebedor in bebedores:
+        bebedor.join()
+    bar.sumar({
+        'entregadas': 0,
+        'tomadas': sum(map(lambda bebedor: bebedor.cervezasTomadas, bebedores)),
+        'pinchadas': 0,
+        'espera': int(1e6 * sum(map(lambda bebedor: bebedor.espera, bebedores)))
+    })
+    bar.cerrarVistas()
+
+# ------------------------------------------------------------------------------------------------ #
+
+def correr(cantidad=cantidad, frecuencia=frecuencia):
+    bar = Bar(cantidad, frecuencia)
+    procesos = [multiprocessing.Process(target=proveedor, args=(bar, i), name=f'Proveedor-{i}') for i in range(cantidad['proveedores'])]
+    procesos.append( multiprocessing.Process(target=repositor, args=(bar,), name='Repositor') )
+    grupos = max(1, min(cantidad['procesos'], cantidad['bebedores']))
+    for i in range(grupos):
+        procesos.append( multiprocessing.Process(target=grupoDeBebedores, args=(bar, range(i, cantidad['bebedores'], grupos)), name=f'Bebedores-{i}') )
+
+    logging.info(f'LOCAL ABIERTO !')
+    for proceso in procesos:
+        proceso.start()
+    bar.cerrado.wait(frecuencia['local'])
+
+    bar.cerrado.set()
+    logging.info(f'LOCAL CERRADO !')
+    bar.heladerasLlenas.set()
+    for hayStock in bar.hayStock + list(bar.depositoHayStock.values()):
+        with hayStock:
+            hayStock.notify_all()
+    bar.porReponer.put(None)
+
+    plazo = time.monotonic() + frecuencia['cierre']
+    for proceso in procesos:
+        proceso.join( max(0, plazo - time.monotonic()) )
+        if proceso.is_alive():
+            logging.warning(f'{proceso.name} no termino antes del plazo de cierre')
+            proceso.terminate()
+    resultado = bar.resultado()
+    bar.cerrarVistas()
+    bar.memoria.unlink()
+    return resultado
+
+# ------------------------------------------------------------------------------------------------ #
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Corre la fiesta de bonus3.py con los bebedores repartidos en varios procesos')
+    parser.add_argument('--heladeras', type=int, default=cantidad['heladeras'])
+    parser.add_argument('--bebedores', type=int, default=cantidad['bebedores'])
+    parser.add_argument('--proveedores', type=int, default=cantidad['proveedores'])
+    parser.add_argument('--procesos', type=int, default=cantidad['procesos'], help='procesos entre los que se reparten los bebedores')
+    parser.add_argument('--local', type=float, default=frecuencia['local'], help='segundos que el local esta abierto')
+    parser.add_argument('--silencioso', action='store_true', help='no mostrar lo que hace cada actor, solo el resultado')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s.%(msecs)03d [%(processName)s %(threadName)s] - %(message)s', datefmt='%H:%M:%S', level=logging.WARNING if args.silencioso else logging.INFO)
+    cantidad.update(heladeras=args.heladeras, bebedores=args.bebedores, proveedores=args.proveedores, procesos=args.procesos)
+    frecuencia.update(local=args.local)
+    for clave, valor in correr(cantidad, frecuencia).items():
+        print(f'{clave}: {valor}')
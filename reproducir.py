@@ -0,0 +1,116 @@
+import sys
+import argparse
+from bonus3 import Traza
+
+# ------------------------------------------------------------------------------------------------ #
+# Lee la traza binaria que graba bonus3.py con registro['traza'] y reconstruye el estado del deposito,
+# de las heladeras y de lo que tienen en la mano los repositores en cualquier instante de la noche,
+# junto con las estadisticas de cada actor. La traza se recorre de a bloques, sin cargarla entera.
+# ------------------------------------------------------------------------------------------------ #
+
+cabecera = Traza.cabecera      # el formato y las tablas son los de Traza en bonus3.py
+registros = {**Traza.anteriores, Traza.version: Traza.registro}     # version -> formato de sus registros
+eventos = Traza.eventos
+roles = Traza.roles
+tipos = Traza.tipos
+registrosPorBloque = 65536
+
+# ------------------------------------------------------------------------------------------------ #
+
+def leerRegistros(archivo):
+    with open(archivo, 'rb') as traza:
+        marca, version, inicio = cabecera.unpack(traza.read(cabecera.size))
+        if marca != Traza.marca or version not in registros:
+            raise ValueError(f'{archivo} no es una traza de bonus3.py')
+        registro = registros[version]
+        while True:
+            bloque = traza.read(registro.size * registrosPorBloque)
+            if not bloque:
+                break
+            yield from registro.iter_unpack(bloque[:len(bloque) - len(bloque) % registro.size])
+
+class Estado:
+    def __init__(self):
+        self.ahora = 0
+        self.deposito = {'lata': 0, 'botella': 0}
+        self.heladeras = {}     # id -> cervezas por tipo
+        self.enMano = {}        # id del repositor -> cervezas por tipo que saco del deposito y todavia no coloco
+        self.actores = {}       # (rol, id) -> estadisticas
+        self.esperando = {}     # (rol, id) -> momento en que empezo a esperar
+
+    def actor(self, rol, id):
+        if (rol, id) not in self.actores:
+            self.actores[(rol, id)] = {'entregadas': 0, 'colocadas': 0, 'tomadas': 0, 'pinchadas': 0, 'esperas': 0, 'espera': 0, 'esperaMaxima': 0}
+        return self.actores[(rol, id)]
+
+    def aplicar(self, momento, evento, rol, id, heladera, tipo, cantidad):
+        self.ahora = momento
+        estadisticas = self.actor(rol, id)
+        if evento == 'entrega':
+            estadisticas['entregadas'] += cantidad
+        elif evento == 'deposito':
+            self.deposito[tipo] += cantidad
+        elif evento == 'retiro':
+            self.deposito[tipo] -= cantidad
+            if rol == 'repositor':
+                mano = self.enMano.setdefault(id, {'lata': 0, 'botella': 0})
+                mano[tipo] += cantidad
+        elif evento == 'colocar':
+            self.heladera(heladera)[tipo] += cantidad
+            estadisticas['colocadas'] += cantidad
+            if rol == 'repositor':
+                mano = self.enMano.setdefault(id, {'lata': 0, 'botella': 0})
+                mano[tipo] -= cantidad
+        elif evento in ('tomada', 'pinchada'):
+            self.heladera(heladera)[tipo] -= cantidad
+            estadisticas['tomadas' if evento == 'tomada' else 'pinchadas'] += cantidad
+        elif evento == 'pinchadas':
+            self.heladera(heladera)[tipo] -= cantidad
+            estadisticas['pinchadas'] += cantidad
+        elif evento == 'esperando':
+            self.esperando[(rol, id)] = momento
+        elif evento == 'finEspera' and (rol, id) in self.esperando:
+            espera = momento - self.esperando.pop((rol, id))
+            estadisticas['esperas'] += 1
+            estadisticas['espera'] += espera
+            estadisticas['esperaMaxima'] = max(estadisticas['esperaMaxima'], espera)
+
+    def heladera(self, id):
+        return self.heladeras.setdefault(id, {'lata': 0, 'botella': 0})
+
+def reproducir(archivo, hasta=None):
+    estado = Estado()
+    for momento, evento, rol, id, heladera, tipo, cantidad in leerRegistros(archivo):
+        if hasta is not None and momento > hasta:
+            break
+        estado.aplicar(momento, eventos[evento], roles[rol], id, heladera, tipos[tipo] if tipo < len(tipos) else None, cantidad)
+    return estado
+
+# ------------------------------------------------------------------------------------------------ #
+
+def mostrar(estado, salida=sys.stdout):
+    print(f'Estado a los {estado.ahora:.3f} segundos', file=salida)
+    print(f'  Deposito: {estado.deposito["lata"]} latas, {estado.deposito["botella"]} botellas', file=salida)
+    for id, cervezas in sorted(estado.heladeras.items()):
+        print(f'  Heladera[{id}]: {cervezas["lata"]} latas, {cervezas["botella"]} botellas', file=salida)
+    for id, cervezas in sorted(estado.enMano.items()):
+        print(f'  Repositor[{id}] en la mano: {cervezas["lata"]} latas, {cervezas["botella"]} botellas', file=salida)
+    for (rol, id), esperando in sorted(estado.esperando.items()):
+        print(f'  {rol.upper()}[{id}] esperando desde los {esperando:.3f} segundos', file=salida)
+    print(file=salida)
+    for (rol, id), estadisticas in sorted(estado.actores.items()):
+        if rol == 'local':
+            continue
+        media = estadisticas['espera'] / estadisticas['esperas'] if estadisticas['esperas'] else 0
+        print(f'  {rol.upper()}[{id}]: {estadisticas["entregadas"]} entregadas, {estadisticas["colocadas"]} colocadas, {estadisticas["tomadas"]} tomadas, {estadisticas["pinchadas"]} pinchadas, '
+              f'{estadisticas["esperas"]} esperas (media {media:.3f}s, maxima {estadisticas["esperaMaxima"]:.3f}s)', file=salida)
+
+# ------------------------------------------------------------------------------------------------ #
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reconstruye una noche de bonus3.py a partir de su traza binaria')
+    parser.add_argument('traza', help="archivo grabado con registro['traza'] en bonus3.py")
+    parser.add_argument('--hasta', type=float, help='segundos desde que abrio el local (por defecto toda la noche)')
+    args = parser.parse_args()
+
+    mostrar( reproducir(args.traza, args.hasta) )
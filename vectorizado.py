@@ -0,0 +1,205 @@
+import time
+import argparse
+import numpy as np
+
+# ------------------------------------------------------------------------------------------------ #
+# Misma fiesta que bonus3.py pero con todo el estado en arrays de NumPy en lugar de un objeto por
+# cerveza y un thread por actor: stock de cada heladera por tipo de envase, latas pinchadas en cada
+# heladera y preferencia, limite, cervezas tomadas y heladera actual de cada bebedor. En cada
+# instante en que algun actor se despierta se avanzan todos juntos con operaciones sobre arrays,
+# asi que se pueden simular miles de heladeras y millones de bebedores en segundos.
+#
+# Diferencias con la version con threads, que no cambian los promedios pero si el detalle:
+#   - las latas pinchadas que salen del deposito se reparten al azar y no en orden de llegada
+#   - un bebedor que saca una lata pinchada la tira y vuelve a intentar en su proximo turno
+#   - el repositor llena al instante, solo se frena cuando al deposito le faltan cervezas
+# ------------------------------------------------------------------------------------------------ #
+
+cantidad = {
+    'heladeras': 3,
+    'bebedores': 5,
+    'proveedores': 1    # proveedores que entregan a la vez, para que alcance con muchas heladeras
+}
+frecuencia = {
+    'repositor': 2, # frecuencia de control de heladeras [Segundos virtuales]
+    'proveedor': 3, # frecuencia de entrega de paquetes de cerveza [Segundos virtuales]
+    'bebedor': 2,   # frecuencia de consumo de cerveza de los clientes [Segundos virtuales]
+    'local': 60     # Tiempo que el local esta abierto [Segundos virtuales]
+}
+capacidad = np.array([15, 10])     # capacidad de cada heladera por tipo de envase
+
+LATA, BOTELLA, CERVEZA = 0, 1, 2    # tipos de envase, CERVEZA es el gusto de los que toman cualquiera
+PROBABILIDAD_LATA = 6 / 11          # randint(0, 10) % 2 == 0
+PROBABILIDAD_PINCHADA = 6 / 26      # randint(0, 25) % 5 == 0
+
+# ------------------------------------------------------------------------------------------------ #
+
+class SimulacionVectorizada:
+    def __init__(self, cantidad=cantidad, frecuencia=frecuencia, semilla=None):
+        self.cantidad = dict(cantidad)
+        self.frecuencia = dict(frecuencia)
+        self.random = np.random.default_rng(semilla)
+
+        heladeras, bebedores = self.cantidad['heladeras'], self.cantidad['bebedores']
+        self.stock = np.zeros((heladeras, 2), dtype=np.int64)          # cervezas por heladera y tipo de envase
+        self.pinchadas = np.zeros(heladeras, dtype=np.int64)            # de las latas de cada heladera, cuantas estan pinchadas
+        self.deposito = np.zeros(2, dtype=np.int64)
+        self.depositoPinchadas = 0
+        self.heladerasLlenas = False
+        self.repositorEsperando = False                                 # quedo frenado esperando al proveedor
+
+        self.limite = self.random.integers(1, 11, size=bebedores)
+        self.gusto = np.array([BOTELLA, LATA, CERVEZA])[self.random.integers(1, 31, size=bebedores) % 3]
+        self.tomadas = np.zeros(bebedores, dtype=np.int64)
+        self.heladera = np.zeros(bebedores, dtype=np.int64)
+        self.esperando = np.zeros(bebedores, dtype=bool)               # los que esperan siguen en la misma heladera
+        self.espera = np.zeros(bebedores)
+
+        self.entregadas = 0
+        self.pinchadasSacadas = 0
+        self.heladeraVacia = 0
+
+    # -------------------------------------------------------------------------------------------- #
+
+    def entregar(self):
+        cervezas = self.random.integers(1, 31, size=self.cantidad['proveedores']).sum()
+        latas = self.random.binomial(cervezas, PROBABILIDAD_LATA)
+        self.deposito += (latas, cervezas - latas)
+        self.depositoPinchadas += self.random.binomial(latas, PROBABILIDAD_PINCHADA)
+        self.entregadas += cervezas
+
+    def quitarPinchadas(self):
+        self.stock[:, LATA] -= self.pinchadas
+        self.pinchadasSacadas += self.pinchadas.sum()
+        self.pinchadas[:] = 0
+
+    def llenar(self):
+        # primero las que tienen menos cervezas y a igual stock la de menor id, como ColaDeHeladeras
+        orden = np.argsort(self.stock.sum(axis=1), kind='stable')
+        faltan = capacidad - self.stock[orden]
+        acumulado = np.cumsum(faltan, axis=0)
+        completas = int((acumulado <= self.deposito).all(axis=1).sum())
+
+        colocadas = np.zeros_like(faltan)
+        colocadas[:completas] = faltan[:completas]
+        self.repositorEsperando = completas < len(orden)
+        if self.repositorEsperando:
+            # en la primera que no se puede completar se ponen las botellas que haya y, solo si
+            # alcanzaron, las latas; las siguientes quedan esperando como con el repositor real
+            antes = acumulado[completas - 1] if completas else np.zeros(2, dtype=np.int64)
+            colocadas[completas, BOTELLA] = min(faltan[completas, BOTELLA], self.deposito[BOTELLA] - antes[BOTELLA])
+            if colocadas[completas, BOTELLA] == faltan[completas, BOTELLA]:
+                colocadas[completas, LATA] = min(faltan[completas, LATA], self.deposito[LATA] - antes[LATA])
+
+        latas = colocadas[:, LATA].sum()
+        if latas:
+            pinchadas = self.random.hypergeometric(self.depositoPinchadas, self.deposito[LATA] - self.depositoPinchadas, latas)
+            self.pinchadas[orden] += self.random.multivariate_hypergeometric(colocadas[:, LATA], pinchadas)
+            self.depositoPinchadas -= pinchadas
+        self.stock[orden] += colocadas
+        self.deposito -= colocadas.sum(axis=0)
+        if not self.repositorEsperando:
+            self.heladerasLlenas = True
+
+    # -------------------------------------------------------------------------------------------- #
+
+    def repartir(self, bebedores, tipos):
+        # cada bebedor pide una cerveza de tipos[i] en su heladera; en cada (heladera, tipo) se
+        # atienden en orden al azar mientras haya stock. Devuelve quienes consiguieron algo y
+        # quienes de esos sacaron una lata pinchada.
+        heladeras = self.heladera[bebedores]
+        claves = heladeras * 2 + tipos
+        orden = np.argsort(claves + self.random.random(len(claves)))
+        ordenadas = claves[orden]
+        posicion = np.empty(len(claves), dtype=np.int64)
+        posicion[orden] = np.arange(len(claves)) - np.searchsorted(ordenadas, ordenadas)
+
+        stock = self.stock.reshape(-1)
+        consiguieron = posicion < stock[claves]
+        sacadas = np.bincount(claves[consiguieron], minlength=len(stock))
+        latas = sacadas[LATA::2]
+        pinchadas = self.random.hypergeometric(self.pinchadas, np.maximum(self.stock[:, LATA] - self.pinchadas, 0), latas)
+        buenas = latas - pinchadas
+        stock -= sacadas
+        self.pinchadas -= pinchadas
+        pincharon = consiguieron & (tipos == LATA) & (posicion >= buenas[heladeras])
+        return consiguieron, pincharon
+
+    def tomarCervezas(self):
+        bebedores = np.flatnonzero(self.tomadas < self.limite)
+        nuevos = bebedores[~self.esperando[bebedores]]
+        self.heladera[nuevos] = self.random.integers(0, self.cantidad['heladeras'], size=len(nuevos))
+
+        gusto = self.gusto[bebedores]
+        tipos = np.where(gusto == CERVEZA, (self.random.random(len(bebedores)) >= PROBABILIDAD_LATA).astype(np.int64), gusto)
+        consiguieron, pincharon = self.repartir(bebedores, tipos)
+
+        otroTipo = ~consiguieron & (gusto == CERVEZA)     # los que toman cualquiera prueban con el otro envase
+        if otroTipo.any():
+            segundo, pincharonSegundo = self.repartir(bebedores[otroTipo], 1 - tipos[otroTipo])
+            consiguieron[otroTipo] = segundo
+            pincharon[otroTipo] = pincharonSegundo
+
+        tomaron = consiguieron & ~pincharon
+        self.tomadas[bebedores[tomaron]] += 1
+        self.esperando[bebedores] = ~tomaron
+        self.espera[bebedores[~consiguieron]] += self.frecuencia['bebedor']
+
+    # -------------------------------------------------------------------------------------------- #
+
+    def correr(self):
+        proximo = {'proveedor': 0, 'repositor': 0, 'bebedor': 0}
+        ahora = 0
+        while ahora < self.frecuencia['local']:
+            if proximo['proveedor'] == ahora:
+                self.entregar()
+                proximo['proveedor'] += self.frecuencia['proveedor']
+                if self.repositorEsperando:         # el repositor frenado sigue apenas llega el proveedor
+                    self.llenar()
+            if proximo['repositor'] <= ahora and not self.repositorEsperando:
+                if self.heladerasLlenas:
+                    self.quitarPinchadas()
+                self.llenar()
+                proximo['repositor'] = ahora + self.frecuencia['repositor']
+            if proximo['bebedor'] <= ahora:
+                if self.heladerasLlenas:
+                    self.tomarCervezas()
+                proximo['bebedor'] = ahora + self.frecuencia['bebedor']
+
+            despiertan = [proximo['proveedor'], proximo['bebedor']] + ([] if self.repositorEsperando else [proximo['repositor']])
+            siguiente = min(despiertan + [self.frecuencia['local']])
+            self.heladeraVacia += int((self.stock.sum(axis=1) == 0).sum()) * (siguiente - ahora)
+            ahora = siguiente
+        return self
+
+    def resultado(self):
+        tomadas = int(self.tomadas.sum())
+        espera = float(self.espera.sum())
+        return {
+            'entregadas': int(self.entregadas),
+            'tomadas': tomadas,
+            'espera': espera,
+            'esperaPorCerveza': espera / tomadas if tomadas else 0,
+            'heladeraVacia': self.heladeraVacia,
+            'pinchadas': int(self.pinchadasSacadas)
+        }
+
+# ------------------------------------------------------------------------------------------------ #
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simula la fiesta de bonus3.py con arrays de NumPy')
+    parser.add_argument('--heladeras', type=int, default=cantidad['heladeras'])
+    parser.add_argument('--bebedores', type=int, default=cantidad['bebedores'])
+    parser.add_argument('--proveedores', type=int, default=cantidad['proveedores'])
+    parser.add_argument('--local', type=float, default=frecuencia['local'], help='segundos virtuales que el local esta abierto')
+    parser.add_argument('--semilla', type=int)
+    args = parser.parse_args()
+
+    cantidad.update(heladeras=args.heladeras, bebedores=args.bebedores, proveedores=args.proveedores)
+    frecuencia.update(local=args.local)
+
+    inicio = time.perf_counter()
+    resultado = SimulacionVectorizada(cantidad, frecuencia, args.semilla).correr().resultado()
+    for clave, valor in resultado.items():
+        print(f'{clave:>18}: {valor}')
+    print(f'{"segundos":>18}: {time.perf_counter() - inicio:.3f}')